@@ -1,12 +1,42 @@
 from fastapi import FastAPI, HTTPException
+from fastapi.responses import Response, StreamingResponse
 from pydantic import BaseModel, Field
-from typing import List, Dict, Any, Optional, Literal, Callable
+from typing import List, Dict, Any, Optional, Literal, Callable, TypeVar, Tuple, Iterator, Set, AsyncIterator
 from datetime import datetime, timezone
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from collections import OrderedDict, deque
+from decimal import Decimal, InvalidOperation
+from bisect import bisect_left
+from contextvars import ContextVar, copy_context
+from contextlib import asynccontextmanager
+import base64
+import hashlib
+import hmac
+import json
+import random
+import sqlite3
+import threading
 import time
 import re
 import requests
+try:
+    import orjson   # optional: faster JSON encoding of responses
+except ImportError:
+    orjson = None
+from requests.adapters import HTTPAdapter
+from urllib.parse import urlsplit
+from email.utils import parsedate_to_datetime
 
-app = FastAPI(title="Crypto backend — balances & history + batch per chain")
+@asynccontextmanager
+async def lifespan(_: FastAPI) -> AsyncIterator[None]:
+    # background services (watch-list pollers, webhook delivery) live as long as the app
+    watch_start()
+    try:
+        yield
+    finally:
+        watch_stop()
+
+app = FastAPI(title="Crypto backend — balances & history + batch per chain", lifespan=lifespan)
 
 # =========================
 # CONFIG
@@ -21,6 +51,60 @@ HEADERS_RPC  = {"x-api-key": TATUM_API_KEY, "content-type": "application/json"}
 ETH_RPC = "https://ethereum-mainnet.gateway.tatum.io"
 BSC_RPC = "https://bsc-mainnet.gateway.tatum.io"
 SOL_RPC = "https://solana-mainnet.gateway.tatum.io"
+# Tatum REST API (v3 routes)
+TATUM_API = "https://api.tatum.io"
+
+# Max calls packed into one JSON-RPC array request
+EVM_RPC_MAX_BATCH = 50
+SOL_RPC_MAX_BATCH = 50
+
+# eth_getLogs scans: block range per query adapts between MIN and MAX,
+# halving on "too many results"/range errors and doubling while queries stay small
+EVM_LOG_CHUNK_INITIAL = 5000
+EVM_LOG_CHUNK_MIN = 1
+EVM_LOG_CHUNK_MAX = 500000
+EVM_LOG_CHUNK_GROW_BELOW = 1000
+# max addresses per topic OR-list in multi-address scans (batch history, watcher)
+EVM_LOG_ADDRESSES_PER_QUERY = 500
+
+# Local SQLite index of USDT Transfer logs for queried addresses (None = always scan upstream)
+LOG_INDEX_PATH: Optional[str] = "usdt_logs.sqlite3"
+# blocks below an address' sync cursor that are re-fetched on every sync (reorg safety)
+EVM_REORG_WINDOW = {"eth": 64, "bsc": 64}
+# an address whose cursor is further behind the queried head is dropped and re-indexed from the head down
+LOG_INDEX_MAX_GAP = 100000
+# indexed addresses kept; beyond this the least recently queried ones are evicted with their transfers
+LOG_INDEX_MAX_ADDRESSES = 10000
+
+# Watch-list webhooks: SQLite store of subscriptions, per-address cursors and the delivery outbox (None = disabled)
+WATCH_DB_PATH: Optional[str] = "watch.sqlite3"
+WATCH_POLL_INTERVAL = {"eth": 12.0, "bsc": 3.0}
+# blocks behind head before a transfer is delivered
+WATCH_CONFIRMATIONS = {"eth": 12, "bsc": 15}
+# max blocks per poll step
+WATCH_MAX_RANGE = 2000
+WEBHOOK_BATCH_MAX = 100
+WEBHOOK_TIMEOUT = 10.0
+WEBHOOK_POLL_INTERVAL = 1.0
+WEBHOOK_RETRY_BASE = 5.0
+WEBHOOK_RETRY_MAX = 3600.0
+WEBHOOK_MAX_ATTEMPTS = 20
+# seconds a delivery loop holds claimed outbox rows; other workers skip them meanwhile
+WEBHOOK_LEASE = 60.0
+
+# Cache of finalized transactions keyed by signature/txID: in-memory LRU tier + optional SQLite tier
+TX_CACHE_MAX_ITEMS = 50000
+TX_CACHE_MAX_BYTES = 256 * 1024 * 1024
+TX_CACHE_DISK_PATH: Optional[str] = None
+TX_CACHE_DISK_MAX_BYTES = 2 * 1024 * 1024 * 1024
+
+# Solana owner -> USDT token account (derived ATA, or the account found via RPC): in-memory LRU + SQLite (None = memory only)
+SOL_ATA_CACHE_PATH: Optional[str] = "sol_ata.sqlite3"
+SOL_ATA_CACHE_MAX_ITEMS = 100000
+
+# Balance cache TTL per chain in seconds (0 = no caching, concurrent lookups are still coalesced)
+BALANCE_TTL = {"eth": 10.0, "bsc": 5.0, "tron": 5.0, "btc": 30.0, "sol": 5.0}
+BALANCE_CACHE_MAX_ITEMS = 100000
 
 # USDT (ETH/BSC/SOL)
 USDT = {
@@ -29,11 +113,14 @@ USDT = {
         "decimals": 6,
         # keccak256("Transfer(address,address,uint256)")
         "topic_transfer": "0xddf252ad1be2c89b69c2b068fc378daa952ba7f163c4a11628f55a4df523b3ef",
+        # block the contract was deployed in; log scans never go below it
+        "deploy_block": 4634748,
     },
     "bsc": {
         "contract": "0x55d398326f99059fF775485246999027B3197955",
         "decimals": 6,
         "topic_transfer": "0xddf252ad1be2c89b69c2b068fc378daa952ba7f163c4a11628f55a4df523b3ef",
+        "deploy_block": 176416,
     },
     "tron": {
         "contract": "TR7NHqjeKQxGTCi8q8ZY4pL8otSzgjLj6t",
@@ -46,6 +133,65 @@ USDT = {
 }
 
 SPL_TOKEN_PROGRAM = "TokenkegQfeZyiNwAJbNbGKPFXCWuBvf9Ss623VQ5DA"
+SPL_ATA_PROGRAM = "ATokenGPvbdGVxr1b2hvZbsiqW5xWH25efTNsLJA8knL"
+# getMultipleAccounts accepts at most 100 keys per call
+SOL_MULTIPLE_ACCOUNTS_MAX = 100
+
+# Decimals of the native unit on each chain (amounts are handled as integers of the smallest unit)
+NATIVE_DECIMALS = {"eth": 18, "bsc": 18, "tron": 6, "btc": 8, "sol": 9}
+
+# Upstream HTTP client: keep-alive connection pool per host, shared by every upstream call.
+# HTTP2_ENABLED switches to httpx with HTTP/2 multiplexing (pip install "httpx[http2]").
+HTTP_POOL_HOSTS = 16
+HTTP_POOL_MAXSIZE = 64
+HTTP2_ENABLED = False
+
+# Token-bucket rate limit per upstream host: (requests/second, burst). 429 + Retry-After pauses the host's bucket.
+RATE_LIMITS = {
+    "api.tatum.io": (50.0, 50),
+    "ethereum-mainnet.gateway.tatum.io": (50.0, 50),
+    "bsc-mainnet.gateway.tatum.io": (50.0, 50),
+    "solana-mainnet.gateway.tatum.io": (50.0, 50),
+}
+RATE_LIMIT_DEFAULT = (20.0, 20)
+# a call that would have to wait longer than this for a slot / Retry-After fails instead of waiting
+RATE_LIMIT_MAX_WAIT = 10.0
+# Global retry budget: retries are allowed at RETRY_BUDGET_RATIO per request sent plus RETRY_BUDGET_MIN_PER_SEC
+RETRY_BUDGET_RATIO = 0.1
+RETRY_BUDGET_MIN_PER_SEC = 2.0
+
+# Circuit breaker per upstream host: opens after BREAKER_FAILURES consecutive failures (connection
+# errors, 5xx), fails fast for BREAKER_OPEN_S, then lets a single probe through (half-open) and
+# closes again if it succeeds. Slow but successful responses (e.g. large eth_getLogs) are not failures.
+BREAKER_FAILURES = 5
+BREAKER_OPEN_S = 30.0
+# Hedged JSON-RPC reads: when the primary is slower than the recent p95 of that RPC method on the
+# host (at least HEDGE_MIN_DELAY_S), a duplicate is sent and the first response wins. Half of the
+# pool runs primaries, half duplicates; a call that finds no idle worker goes out unhedged on the
+# caller's thread, so hedging never queues or caps upstream concurrency.
+HEDGE_ENABLED = False
+HEDGE_MIN_DELAY_S = 0.2
+HEDGE_MIN_SAMPLES = 20
+HEDGE_POOL_SIZE = 32
+
+# /portfolio runs the per-chain lookups on its own pool (they fan out on the batch pool themselves)
+PORTFOLIO_POOL_SIZE = 16
+
+# Metrics at GET /metrics (Prometheus text format). A Server-Timing breakdown is added to responses
+# when the request sends "X-Server-Timing: 1", or always with SERVER_TIMING_ALWAYS.
+METRICS_PREFIX = "backend_"
+METRICS_LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+METRICS_SIZE_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000)
+SERVER_TIMING_ALWAYS = False
+
+# Batch fan-out: shared worker pool + max in-flight calls per provider for one batch
+BATCH_POOL_SIZE = 64
+BATCH_CONCURRENCY = {
+    "tatum": 10,
+    "eth_rpc": 16,
+    "bsc_rpc": 16,
+    "sol_rpc": 8,
+}
 
 # =========================
 # UTILS
@@ -53,21 +199,59 @@ SPL_TOKEN_PROGRAM = "TokenkegQfeZyiNwAJbNbGKPFXCWuBvf9Ss623VQ5DA"
 def utc_now() -> str:
     return datetime.now(timezone.utc).isoformat()
 
-def to_wei(x: float, decimals: int = 18) -> int:
-    return int(round(x * (10 ** decimals)))
+def _json_bytes(obj: Any) -> bytes:
+    if orjson is not None:
+        try:
+            return orjson.dumps(obj, default=str)
+        except TypeError:
+            # e.g. ints wider than 64 bits
+            pass
+    return json.dumps(obj, separators=(",", ":"), ensure_ascii=False, default=str).encode()
+
+def json_bytes(obj: Any) -> bytes:
+    t0 = time.perf_counter()
+    out = _json_bytes(obj)
+    dt = time.perf_counter() - t0
+    m_serialize_seconds.observe(dt)
+    timing_add("serialize", dt)
+    return out
+
+class FastJSONResponse(Response):
+    # Returned directly from handlers so FastAPI skips jsonable_encoder and its own json.dumps
+    media_type = "application/json"
+
+    def render(self, content: Any) -> bytes:
+        return json_bytes(content)
 
-def from_units(x: int, decimals: int) -> float:
+# exact amounts: integer base units <-> decimal strings, no float on the way
+_POW10 = [10 ** i for i in range(78)]
+
+def format_units(raw: int, decimals: int) -> str:
+    # trailing zeros stripped, at least one fractional digit ("1.5", "2.0")
     if decimals <= 0:
-        return float(x)
-    return round(x / (10 ** decimals), 12)
+        return f"{raw * _POW10[-decimals]}.0"
+    if raw < 0:
+        return "-" + format_units(-raw, decimals)
+    s = str(raw).rjust(decimals + 1, "0")
+    return s[:-decimals] + "." + (s[-decimals:].rstrip("0") or "0")
 
-def fmt_decimal(value: float, max_dp: int = 18) -> str:
-    s = f"{value:.{max_dp}f}"
-    if "." in s:
-        s = s.rstrip("0").rstrip(".")
-        if "." not in s:
-            s = s + ".0"
-    return s
+def parse_units(value: Any, decimals: int) -> int:
+    # decimal string/number from an upstream payload -> integer base units;
+    # digits beyond `decimals` are truncated. Raises ValueError on garbage.
+    if isinstance(value, int):
+        return value * _POW10[decimals]
+    s = value if isinstance(value, str) else str(value)
+    whole, _, frac = s.partition(".")
+    # fast path: plain [-]digits[.digits]; isdecimal() accepts exactly the digits int() does
+    if (whole.isdecimal() or (whole[:1] == "-" and whole[1:].isdecimal())) and (frac.isdecimal() or not frac):
+        if len(frac) <= decimals:
+            return int(whole + frac) * _POW10[decimals - len(frac)]
+        return int(whole + frac[:decimals])
+    # exponent notation (str() of small/large floats), whitespace and other forms Decimal understands
+    try:
+        return int(Decimal(s).scaleb(decimals))
+    except (InvalidOperation, ValueError, OverflowError):
+        raise ValueError(f"invalid amount: {value!r}")
 
 # validators
 _base58_re = re.compile(r"^[1-9A-HJ-NP-Za-km-z]+$")
@@ -95,6 +279,578 @@ def is_solana_address(addr: str) -> bool:
         return False
     return 32 <= len(addr) <= 44
 
+# Metrics
+def _label_value(v: str) -> str:
+    return v.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, help: str, labelnames: Tuple[str, ...] = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = labelnames
+        self._lock = threading.Lock()
+        self._values: Dict[Tuple[str, ...], Any] = {}
+
+    def _labels(self, values: Tuple[str, ...], extra: str = "") -> str:
+        parts = [f'{k}="{_label_value(str(v))}"' for k, v in zip(self.labelnames, values)]
+        if extra:
+            parts.append(extra)
+        return "{" + ",".join(parts) + "}" if parts else ""
+
+    def render(self) -> List[str]:
+        with self._lock:
+            items = list(self._values.items())
+        return [f"{self.name}{self._labels(k)} {v}" for k, v in items]
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, *labels: str) -> None:
+        self.add(1, *labels)
+
+    def add(self, value: float, *labels: str) -> None:
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + value
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def set(self, value: float, *labels: str) -> None:
+        with self._lock:
+            self._values[labels] = value
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labelnames: Tuple[str, ...] = (), buckets: Tuple[float, ...] = METRICS_LATENCY_BUCKETS):
+        super().__init__(name, help, labelnames)
+        self.buckets = buckets
+
+    def observe(self, value: float, *labels: str) -> None:
+        i = bisect_left(self.buckets, value)
+        with self._lock:
+            st = self._values.get(labels)
+            if st is None:
+                st = self._values[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+            st[0][i] += 1
+            st[1] += value
+
+    def render(self) -> List[str]:
+        with self._lock:
+            items = [(k, list(counts), total) for k, (counts, total) in self._values.items()]
+        out = []
+        for k, counts, total in items:
+            acc = 0
+            for le, n in zip([str(b) for b in self.buckets] + ["+Inf"], counts):
+                acc += n
+                lbl = self._labels(k, f'le="{le}"')
+                out.append(f"{self.name}_bucket{lbl} {acc}")
+            out.append(f"{self.name}_sum{self._labels(k)} {total}")
+            out.append(f"{self.name}_count{self._labels(k)} {acc}")
+        return out
+
+class MetricsRegistry:
+    # In-process metrics; collectors are called at scrape time and return
+    # (name, kind, help, [(labels dict, value)]) families for state owned elsewhere.
+    def __init__(self, prefix: str):
+        self.prefix = prefix
+        self._metrics: List[_Metric] = []
+        self._collectors: List[Callable[[], List[Tuple[str, str, str, List[Tuple[Dict[str, str], float]]]]]] = []
+
+    def _add(self, m: Any) -> Any:
+        self._metrics.append(m)
+        return m
+
+    def counter(self, name: str, help: str, labelnames: Tuple[str, ...] = ()) -> Counter:
+        return self._add(Counter(self.prefix + name, help, labelnames))
+
+    def gauge(self, name: str, help: str, labelnames: Tuple[str, ...] = ()) -> Gauge:
+        return self._add(Gauge(self.prefix + name, help, labelnames))
+
+    def histogram(self, name: str, help: str, labelnames: Tuple[str, ...] = (), buckets: Tuple[float, ...] = METRICS_LATENCY_BUCKETS) -> Histogram:
+        return self._add(Histogram(self.prefix + name, help, labelnames, buckets))
+
+    def collector(self, fn: Callable[[], List[Tuple[str, str, str, List[Tuple[Dict[str, str], float]]]]]) -> Callable:
+        self._collectors.append(fn)
+        return fn
+
+    def render(self) -> str:
+        lines: List[str] = []
+        for m in self._metrics:
+            lines += [f"# HELP {m.name} {m.help}", f"# TYPE {m.name} {m.kind}"] + m.render()
+        merged: Dict[str, Tuple[str, str, List[Tuple[Dict[str, str], float]]]] = {}
+        for fn in self._collectors:
+            try:
+                families = fn()
+            except Exception:
+                continue
+            for name, kind, help, samples in families:
+                merged.setdefault(self.prefix + name, (kind, help, []))[2].extend(samples)
+        for name, (kind, help, samples) in merged.items():
+            lines += [f"# HELP {name} {help}", f"# TYPE {name} {kind}"]
+            for labels, value in samples:
+                lbl = ",".join(f'{k}="{_label_value(str(v))}"' for k, v in labels.items())
+                lines.append(f"{name}{{{lbl}}} {value}" if lbl else f"{name} {value}")
+        return "\n".join(lines) + "\n"
+
+metrics = MetricsRegistry(METRICS_PREFIX)
+m_http_seconds = metrics.histogram("http_request_seconds", "Request latency by route", ("method", "route", "status"))
+m_batch_size = metrics.histogram("batch_size", "Addresses per batch request", ("route",), METRICS_SIZE_BUCKETS)
+m_serialize_seconds = metrics.histogram("serialize_seconds", "JSON encoding time per response body or NDJSON line", (), (0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5))
+m_upstream_seconds = metrics.histogram("upstream_request_seconds", "Upstream HTTP attempt latency", ("host", "method"))
+m_upstream_responses = metrics.counter("upstream_responses_total", "Upstream HTTP attempts by status code (error = no response)", ("host", "code"))
+m_upstream_inflight = metrics.gauge("upstream_inflight", "Upstream HTTP requests in flight", ("host",))
+m_upstream_retries = metrics.counter("upstream_retries_total", "Upstream retries by reason", ("host", "reason"))
+m_rpc_seconds = metrics.histogram("rpc_seconds", "JSON-RPC call latency by method (batch = array request)", ("method",))
+m_rpc_errors = metrics.counter("rpc_errors_total", "JSON-RPC errors by method", ("method",))
+m_rpc_batch_calls = metrics.histogram("rpc_batch_calls", "Calls per JSON-RPC array request", (), METRICS_SIZE_BUCKETS)
+m_helper_seconds = metrics.histogram("helper_seconds", "Per-address balance/history helper latency", ("helper",))
+m_helper_results = metrics.counter("helper_results_total", "Per-address helper results by status", ("helper", "status"))
+
+class RequestTiming:
+    # per-request accumulator for the Server-Timing header; shared with worker threads via context copies
+    __slots__ = ("scope", "parts", "_lock")
+
+    def __init__(self, scope: Dict[str, Any]):
+        self.scope = scope
+        self.parts: Dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def add(self, name: str, seconds: float) -> None:
+        with self._lock:
+            self.parts[name] = self.parts.get(name, 0.0) + seconds
+
+    def route(self) -> str:
+        route = self.scope.get("route")
+        return getattr(route, "path", "unmatched")
+
+    def header(self, total: float) -> str:
+        with self._lock:
+            parts = list(self.parts.items())
+        return ", ".join([f"{k};dur={v * 1000:.1f}" for k, v in parts] + [f"total;dur={total * 1000:.1f}"])
+
+_request_timing: ContextVar[Optional[RequestTiming]] = ContextVar("request_timing", default=None)
+
+def timing_add(name: str, seconds: float) -> None:
+    t = _request_timing.get()
+    if t is not None:
+        t.add(name, seconds)
+
+def observe_batch(n: int) -> None:
+    t = _request_timing.get()
+    m_batch_size.observe(n, t.route() if t is not None else "-")
+
+def submit_ctx(pool: ThreadPoolExecutor, fn: Callable[..., Any], *args: Any) -> Any:
+    # pool.submit that keeps the caller's context (request timing) in the worker
+    return pool.submit(copy_context().run, fn, *args)
+
+def _result_status(r: Any) -> str:
+    return (r.get("status") if isinstance(r, dict) else getattr(r, "status", None)) or "ok"
+
+def instrumented(helper: str) -> Callable[[Callable[..., Any]], Callable[..., Any]]:
+    # latency + status counts for helpers returning status dicts or BalanceResult(s)
+    def wrap(fn: Callable[..., Any]) -> Callable[..., Any]:
+        def inner(*args: Any, **kwargs: Any) -> Any:
+            t0 = time.perf_counter()
+            try:
+                res = fn(*args, **kwargs)
+            except Exception:
+                m_helper_results.inc(helper, "exception")
+                raise
+            finally:
+                m_helper_seconds.observe(time.perf_counter() - t0, helper)
+            for r in res if isinstance(res, list) else (res,):
+                m_helper_results.inc(helper, _result_status(r))
+            return res
+        inner.__name__ = fn.__name__
+        inner.__wrapped__ = fn
+        return inner
+    return wrap
+
+class MetricsMiddleware:
+    # plain ASGI middleware: route latency histogram + optional Server-Timing header
+    def __init__(self, app: Any):
+        self.app = app
+
+    async def __call__(self, scope: Dict[str, Any], receive: Any, send: Any) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        timing = RequestTiming(scope)
+        token = _request_timing.set(timing)
+        want = SERVER_TIMING_ALWAYS or any(k == b"x-server-timing" for k, _ in scope.get("headers") or [])
+        t0 = time.perf_counter()
+        status = 500
+
+        async def send_wrapper(message: Dict[str, Any]) -> None:
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                if want:
+                    message["headers"] = list(message.get("headers") or []) + [
+                        (b"server-timing", timing.header(time.perf_counter() - t0).encode())
+                    ]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            _request_timing.reset(token)
+            m_http_seconds.observe(time.perf_counter() - t0, scope["method"], timing.route(), str(status))
+
+app.add_middleware(MetricsMiddleware)
+
+# Pooled HTTP client
+class UpstreamClient:
+    def __init__(self, pool_hosts: int, pool_maxsize: int, http2: bool = False):
+        self._session = requests.Session()
+        self._adapter = HTTPAdapter(pool_connections=pool_hosts, pool_maxsize=pool_maxsize)
+        self._session.mount("https://", self._adapter)
+        self._session.mount("http://", self._adapter)
+        self._h2: Any = None
+        self._h2_counts: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        if http2:
+            try:
+                import httpx
+                self._h2 = httpx.Client(
+                    http2=True,
+                    limits=httpx.Limits(max_connections=pool_hosts * pool_maxsize, max_keepalive_connections=pool_hosts * pool_maxsize),
+                )
+            except ImportError:
+                raise RuntimeError('HTTP2_ENABLED requires httpx with HTTP/2 support: pip install "httpx[http2]"')
+            self._httpx = httpx
+
+    def request(
+        self,
+        method: str,
+        url: str,
+        headers: Dict[str, str],
+        *,
+        params: Optional[Dict[str, Any]] = None,
+        json: Any = None,
+        data: Optional[bytes] = None,
+        timeout: float = 20,
+    ) -> requests.Response:
+        if self._h2 is None:
+            return self._session.request(method, url, headers=headers, params=params, json=json, data=data, timeout=timeout)
+        return self._request_h2(method, url, headers, params, json, data, timeout)
+
+    def _request_h2(self, method: str, url: str, headers: Dict[str, str], params: Any, body: Any, data: Optional[bytes], timeout: float) -> requests.Response:
+        # httpx response/errors are mapped onto requests types so callers keep one error model
+        httpx = self._httpx
+        try:
+            hr = self._h2.request(method, url, headers=headers, params=params, json=body, content=data, timeout=timeout)
+        except httpx.TimeoutException as e:
+            raise requests.Timeout(str(e))
+        except httpx.TransportError as e:
+            raise requests.ConnectionError(str(e))
+        with self._lock:
+            self._h2_counts[hr.http_version] = self._h2_counts.get(hr.http_version, 0) + 1
+        r = requests.Response()
+        r.status_code = hr.status_code
+        r.headers = requests.structures.CaseInsensitiveDict(hr.headers)
+        r._content = hr.content
+        r.url = str(hr.url)
+        r.reason = hr.reason_phrase
+        r.encoding = hr.encoding
+        return r
+
+    def stats(self) -> Dict[str, Any]:
+        if self._h2 is not None:
+            with self._lock:
+                return {"backend": "httpx", "responses_by_http_version": dict(self._h2_counts)}
+        pools = self._adapter.poolmanager.pools
+        hosts = []
+        for key in pools.keys():
+            pool = pools.get(key)
+            if pool is None:
+                continue
+            opened, served = pool.num_connections, pool.num_requests
+            hosts.append({
+                "host": f"{pool.scheme}://{pool.host}:{pool.port}",
+                "in_use": pool.pool.maxsize - pool.pool.qsize() if pool.pool is not None else 0,
+                "connections_opened": opened,
+                "requests": served,
+                "reuse_ratio": round(1 - opened / served, 4) if served else 0.0,
+            })
+        return {"backend": "requests", "pool_maxsize": self._adapter._pool_maxsize, "hosts": hosts}
+
+http_client = UpstreamClient(HTTP_POOL_HOSTS, HTTP_POOL_MAXSIZE, HTTP2_ENABLED)
+
+# Rate limiting
+class RateLimitedError(requests.RequestException):
+    pass
+
+class TokenBucket:
+    # reserve() always takes a token, letting the balance go negative: each caller is handed its own
+    # slot in the future and waits only until then, so callers are spaced at exactly `rate`.
+    def __init__(self, rate: float, burst: int):
+        self.rate = rate
+        self.burst = burst
+        self._tokens = float(burst)
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = threading.Lock()
+        self.throttled = 0
+        self.rejected = 0
+
+    def reserve(self) -> float:
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            self._tokens -= 1
+            wait_s = max(-self._tokens / self.rate if self._tokens < 0 else 0.0, self._paused_until - now)
+            if wait_s > 0:
+                self.throttled += 1
+            return wait_s
+
+    def cancel(self) -> None:
+        with self._lock:
+            self._tokens = min(self.burst, self._tokens + 1)
+            self.rejected += 1
+
+    def pause(self, seconds: float) -> None:
+        with self._lock:
+            self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "rate": self.rate,
+                "burst": self.burst,
+                "tokens": round(self._tokens, 2),
+                "paused_for": round(max(0.0, self._paused_until - time.monotonic()), 2),
+                "throttled": self.throttled,
+                "rejected": self.rejected,
+            }
+
+class RetryBudget:
+    def __init__(self, ratio: float, min_per_sec: float, max_balance: float = 100.0):
+        self.ratio = ratio
+        self.min_per_sec = min_per_sec
+        self.max_balance = max_balance
+        self._balance = 0.0
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+        self.denied = 0
+
+    def deposit(self) -> None:
+        with self._lock:
+            self._balance = min(self.max_balance, self._balance + self.ratio)
+
+    def withdraw(self) -> bool:
+        with self._lock:
+            now = time.monotonic()
+            self._balance = min(self.max_balance, self._balance + (now - self._updated) * self.min_per_sec)
+            self._updated = now
+            if self._balance >= 1:
+                self._balance -= 1
+                return True
+            self.denied += 1
+            return False
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {"balance": round(self._balance, 2), "denied": self.denied}
+
+class CircuitOpenError(requests.RequestException):
+    pass
+
+class CircuitBreaker:
+    def __init__(self, failures: int, open_s: float):
+        self.failures = failures
+        self.open_s = open_s
+        self.state: Literal["closed", "open", "half_open"] = "closed"
+        self._fails = 0
+        self._opened_at = 0.0
+        self._lock = threading.Lock()
+        self.opens = 0
+        self.rejected = 0
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self.state == "closed":
+                return True
+            if self.state == "open" and time.monotonic() - self._opened_at >= self.open_s:
+                self.state = "half_open"
+                return True
+            self.rejected += 1
+            return False
+
+    def record(self, ok: bool) -> None:
+        with self._lock:
+            if ok:
+                self._fails = 0
+                if self.state == "half_open":
+                    self.state = "closed"
+                return
+            self._fails += 1
+            if self.state == "half_open" or (self.state == "closed" and self._fails >= self.failures):
+                self.state = "open"
+                self._opened_at = time.monotonic()
+                self.opens += 1
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {"state": self.state, "consecutive_failures": self._fails, "opens": self.opens, "rejected": self.rejected}
+
+class LatencyWindow:
+    # recent successful call latencies; p95 is recomputed every 10 samples
+    def __init__(self, size: int = 200):
+        self._samples: deque = deque(maxlen=size)
+        self._since = 0
+        self._p95: Optional[float] = None
+        self._lock = threading.Lock()
+
+    def add(self, seconds: float) -> None:
+        with self._lock:
+            self._samples.append(seconds)
+            self._since += 1
+            if self._since >= 10:
+                self._since = 0
+                xs = sorted(self._samples)
+                self._p95 = xs[int(len(xs) * 0.95) - 1] if len(xs) >= HEDGE_MIN_SAMPLES else None
+
+    def p95(self) -> Optional[float]:
+        with self._lock:
+            return self._p95
+
+class UpstreamHost:
+    def __init__(self, host: str):
+        rate, burst = RATE_LIMITS.get(host, RATE_LIMIT_DEFAULT)
+        self.host = host
+        self.bucket = TokenBucket(rate, burst)
+        self.breaker = CircuitBreaker(BREAKER_FAILURES, BREAKER_OPEN_S)
+        self.hedges = 0
+        self.hedge_wins = 0
+        self._latency: Dict[str, LatencyWindow] = {}
+        self._latency_lock = threading.Lock()
+
+    def latency(self, key: str) -> LatencyWindow:
+        # one window per RPC method: slow eth_getLogs scans must not set the eth_getBalance delay
+        with self._latency_lock:
+            w = self._latency.get(key)
+            if w is None:
+                w = self._latency[key] = LatencyWindow()
+            return w
+
+    def p95s(self) -> Dict[str, Optional[float]]:
+        with self._latency_lock:
+            windows = dict(self._latency)
+        return {k: w.p95() for k, w in windows.items()}
+
+_upstreams: Dict[str, UpstreamHost] = {}
+_upstreams_lock = threading.Lock()
+retry_budget = RetryBudget(RETRY_BUDGET_RATIO, RETRY_BUDGET_MIN_PER_SEC)
+_hedge_pool = ThreadPoolExecutor(max_workers=HEDGE_POOL_SIZE, thread_name_prefix="hedge")
+_hedge_primary_slots = threading.Semaphore(HEDGE_POOL_SIZE // 2)
+_hedge_duplicate_slots = threading.Semaphore(HEDGE_POOL_SIZE - HEDGE_POOL_SIZE // 2)
+
+def upstream(host: str) -> UpstreamHost:
+    with _upstreams_lock:
+        u = _upstreams.get(host)
+        if u is None:
+            u = _upstreams[host] = UpstreamHost(host)
+        return u
+
+def _acquire_slot(bucket: TokenBucket, host: str) -> None:
+    wait_s = bucket.reserve()
+    if wait_s > RATE_LIMIT_MAX_WAIT:
+        bucket.cancel()
+        raise RateLimitedError(f"{host}: rate limited, next slot in {wait_s:.1f}s")
+    if wait_s > 0:
+        time.sleep(wait_s)
+
+def _retry_after(r: requests.Response) -> Optional[float]:
+    v = r.headers.get("Retry-After")
+    if not v:
+        return None
+    try:
+        return max(0.0, float(v))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, (parsedate_to_datetime(v) - datetime.now(timezone.utc)).total_seconds())
+    except (TypeError, ValueError):
+        return None
+
+def _latency_key(method: str, body: Any) -> str:
+    # JSON-RPC method (a batch by its first call), else the HTTP method
+    if isinstance(body, list) and body and isinstance(body[0], dict):
+        return f"batch:{body[0].get('method')}"
+    if isinstance(body, dict) and "method" in body:
+        return str(body["method"])
+    return method
+
+def _send_once(u: UpstreamHost, method: str, url: str, headers: Dict[str, str], params: Any, body: Any, timeout: float) -> requests.Response:
+    t0 = time.monotonic()
+    m_upstream_inflight.add(1, u.host)
+    try:
+        r = http_client.request(method, url, headers, params=params, json=body, timeout=timeout)
+    except requests.RequestException:
+        u.breaker.record(False)
+        m_upstream_responses.inc(u.host, "error")
+        raise
+    finally:
+        elapsed = time.monotonic() - t0
+        m_upstream_inflight.add(-1, u.host)
+        m_upstream_seconds.observe(elapsed, u.host, method)
+        timing_add("upstream", elapsed)
+    m_upstream_responses.inc(u.host, str(r.status_code))
+    ok = r.status_code < 500
+    u.breaker.record(ok)
+    if ok:
+        u.latency(_latency_key(method, body)).add(elapsed)
+    return r
+
+def _submit_idle(slots: threading.Semaphore, fn: Callable[..., Any], *args: Any) -> Optional[Any]:
+    # runs fn on _hedge_pool only if one of its workers is idle right now; never queues
+    if not slots.acquire(blocking=False):
+        return None
+
+    def run() -> Any:
+        try:
+            return fn(*args)
+        finally:
+            slots.release()
+
+    return submit_ctx(_hedge_pool, run)
+
+def _send_hedged(u: UpstreamHost, method: str, url: str, headers: Dict[str, str], params: Any, body: Any, timeout: float) -> requests.Response:
+    p95 = u.latency(_latency_key(method, body)).p95()
+    if p95 is None or u.breaker.state != "closed":
+        return _send_once(u, method, url, headers, params, body, timeout)
+    primary = _submit_idle(_hedge_primary_slots, _send_once, u, method, url, headers, params, body, timeout)
+    if primary is None:
+        return _send_once(u, method, url, headers, params, body, timeout)
+    done, _ = wait([primary], timeout=max(HEDGE_MIN_DELAY_S, p95))
+    if done:
+        return primary.result()
+    # the duplicate only goes out if a rate-limit slot is free right now
+    if u.bucket.reserve() > 0:
+        u.bucket.cancel()
+        return primary.result()
+    hedge = _submit_idle(_hedge_duplicate_slots, _send_once, u, method, url, headers, params, body, timeout)
+    if hedge is None:
+        u.bucket.cancel()
+        return primary.result()
+    u.hedges += 1
+    pending = {primary, hedge}
+    error: Optional[BaseException] = None
+    while pending:
+        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+        for fut in done:
+            if fut.exception() is None:
+                if fut is hedge:
+                    u.hedge_wins += 1
+                return fut.result()
+            error = fut.exception()
+    raise error
+
 # HTTP w/ retry
 def request_with_retry(
     method: Literal["GET", "POST"],
@@ -102,61 +858,373 @@ def request_with_retry(
     headers: Dict[str, str],
     *,
     params: Optional[Dict[str, Any]] = None,
-    json: Optional[Dict[str, Any]] = None,
+    json: Any = None,
     timeout: int = 20,
     retries: int = 2,
     backoff_factor: float = 0.7,
+    hedge: bool = False,
 ) -> requests.Response:
+    # Retries 429/5xx and connection errors with full-jitter exponential backoff, honouring Retry-After.
+    # Retries draw from the global retry_budget; a wait longer than RATE_LIMIT_MAX_WAIT fails fast,
+    # as does any call while the host's circuit breaker is open.
+    # hedge=True (idempotent calls only) allows a duplicate request when HEDGE_ENABLED.
+    host = urlsplit(url).netloc
+    u = upstream(host)
+    send = _send_hedged if hedge and HEDGE_ENABLED else _send_once
     attempt = 0
     while True:
+        _acquire_slot(u.bucket, host)
+        if not u.breaker.allow():
+            raise CircuitOpenError(f"{host}: circuit open")
+        if attempt == 0:
+            retry_budget.deposit()
         try:
-            if method == "GET":
-                r = requests.get(url, headers=headers, params=params, timeout=timeout)
-            else:
-                r = requests.post(url, headers=headers, params=params, json=json, timeout=timeout)
-            if 500 <= r.status_code < 600 and attempt < retries:
-                attempt += 1
-                time.sleep(backoff_factor * (2 ** (attempt - 1)))
-                continue
-            return r
-        except (requests.Timeout, requests.ConnectionError):
-            if attempt >= retries:
+            r = send(u, method, url, headers, params, json, timeout)
+        except (requests.Timeout, requests.ConnectionError) as e:
+            if attempt >= retries or not retry_budget.withdraw():
                 raise
-            attempt += 1
-            time.sleep(backoff_factor * (2 ** (attempt - 1)))
+            m_upstream_retries.inc(host, "timeout" if isinstance(e, requests.Timeout) else "connection")
+            delay = random.uniform(0, backoff_factor * (2 ** attempt))
+        else:
+            if r.status_code != 429 and not 500 <= r.status_code < 600:
+                return r
+            retry_after = _retry_after(r)
+            if r.status_code == 429:
+                # the whole host backs off, not just this caller
+                u.bucket.pause(retry_after if retry_after is not None else backoff_factor * (2 ** attempt))
+            if attempt >= retries or (retry_after or 0) > RATE_LIMIT_MAX_WAIT or not retry_budget.withdraw():
+                return r
+            m_upstream_retries.inc(host, str(r.status_code))
+            delay = max(retry_after or 0.0, random.uniform(0, backoff_factor * (2 ** attempt)))
+        attempt += 1
+        time.sleep(delay)
+
+def upstream_stats() -> Dict[str, Any]:
+    with _upstreams_lock:
+        hosts = dict(_upstreams)
+    return {
+        "hosts": {
+            h: {
+                "rate_limit": u.bucket.stats(),
+                "breaker": u.breaker.stats(),
+                "p95_s": u.p95s(),
+                "hedges": u.hedges,
+                "hedge_wins": u.hedge_wins,
+            }
+            for h, u in hosts.items()
+        },
+        "retry_budget": retry_budget.stats(),
+    }
+
+# Batch fan-out
+T = TypeVar("T")
+R = TypeVar("R")
+
+_batch_pool = ThreadPoolExecutor(max_workers=BATCH_POOL_SIZE, thread_name_prefix="batch")
+
+def fan_out_iter(
+    items: List[T],
+    fn: Callable[[T], R],
+    provider: str,
+    on_error: Callable[[T, Exception], R],
+) -> Iterator[Tuple[int, R]]:
+    # Yields (index, result) in completion order with at most BATCH_CONCURRENCY[provider] calls
+    # in flight. New calls are only submitted as results are consumed, so a slow consumer
+    # holds at most that many results; an exception in one item only affects that item.
+    limit = max(1, min(BATCH_CONCURRENCY.get(provider, 8), len(items)))
+    if limit == 1:
+        for i, it in enumerate(items):
+            try:
+                res = fn(it)
+            except Exception as e:
+                res = on_error(it, e)
+            yield i, res
+        return
+
+    pending: Dict[Any, int] = {}
+    next_i = 0
+    try:
+        while next_i < len(items) or pending:
+            while next_i < len(items) and len(pending) < limit:
+                pending[submit_ctx(_batch_pool, fn, items[next_i])] = next_i
+                next_i += 1
+            done, _ = wait(list(pending), return_when=FIRST_COMPLETED)
+            for fut in done:
+                i = pending.pop(fut)
+                try:
+                    res = fut.result()
+                except Exception as e:
+                    res = on_error(items[i], e)
+                yield i, res
+    finally:
+        # consumer went away (e.g. client disconnected mid-stream)
+        for fut in pending:
+            fut.cancel()
+
+def fan_out(
+    items: List[T],
+    fn: Callable[[T], R],
+    provider: str,
+    on_error: Callable[[T, Exception], R],
+) -> List[R]:
+    # fan_out_iter with results returned in input order
+    results: List[Any] = [None] * len(items)
+    for i, res in fan_out_iter(items, fn, provider, on_error):
+        results[i] = res
+    return results
+
+def error_text(e: Exception) -> str:
+    if isinstance(e, HTTPException):
+        return str(e.detail)
+    return str(e) or type(e).__name__
 
 # EVM RPC helpers
-def evm_rpc(url: str, method: str, params: list) -> Any:
+def _rpc_call(url: str, method: str, params: list) -> Any:
     payload = {"jsonrpc": "2.0", "id": 1, "method": method, "params": params}
-    r = request_with_retry("POST", url, HEADERS_RPC, json=payload, timeout=25)
-    r.raise_for_status()
-    j = r.json()
+    t0 = time.perf_counter()
+    try:
+        r = request_with_retry("POST", url, HEADERS_RPC, json=payload, timeout=25, hedge=True)
+        r.raise_for_status()
+        j = r.json()
+    except requests.RequestException:
+        m_rpc_errors.inc(method)
+        raise
+    finally:
+        m_rpc_seconds.observe(time.perf_counter() - t0, method)
     if "error" in j:
+        m_rpc_errors.inc(method)
         raise HTTPException(502, detail=j["error"])
     return j.get("result")
 
+def evm_rpc(url: str, method: str, params: list) -> Any:
+    return _rpc_call(url, method, params)
+
+class RpcError(Exception):
+    def __init__(self, error: Any):
+        self.error = error
+        msg = error.get("message") if isinstance(error, dict) else None
+        super().__init__(msg or str(error))
+
+def rpc_batch(url: str, calls: List[Tuple[str, list]], max_batch: int) -> List[Any]:
+    # Sends calls as JSON-RPC array requests of up to max_batch entries and matches responses by id.
+    # Each slot of the result holds the call's result, or the exception that failed it
+    # (RpcError for a per-call error, requests.RequestException when its whole chunk failed).
+    out: List[Any] = [None] * len(calls)
+    for start in range(0, len(calls), max(1, max_batch)):
+        chunk = calls[start:start + max_batch]
+        payload = [{"jsonrpc": "2.0", "id": start + i, "method": m, "params": p} for i, (m, p) in enumerate(chunk)]
+        m_rpc_batch_calls.observe(len(chunk))
+        t0 = time.perf_counter()
+        try:
+            r = request_with_retry("POST", url, HEADERS_RPC, json=payload, timeout=25, hedge=True)
+            r.raise_for_status()
+            j = r.json()
+        except requests.RequestException as e:
+            m_rpc_errors.inc("batch")
+            out[start:start + len(chunk)] = [e] * len(chunk)
+            continue
+        finally:
+            m_rpc_seconds.observe(time.perf_counter() - t0, "batch")
+        if not isinstance(j, list):
+            # provider rejected the batch as a whole
+            err = RpcError((j or {}).get("error") if isinstance(j, dict) else j)
+            out[start:start + len(chunk)] = [err] * len(chunk)
+            continue
+        by_id = {it.get("id"): it for it in j if isinstance(it, dict)}
+        for i in range(len(chunk)):
+            it = by_id.get(start + i)
+            if it is None:
+                out[start + i] = RpcError({"code": -32603, "message": "no response for call in batch"})
+            elif "error" in it:
+                m_rpc_errors.inc(chunk[i][0])
+                out[start + i] = RpcError(it["error"])
+            else:
+                out[start + i] = it.get("result")
+    return out
+
 def evm_get_balance(url: str, address: str) -> int:
     res = evm_rpc(url, "eth_getBalance", [address, "latest"])
     return int(res, 16)
 
-def evm_get_logs(url: str, address_contract: str, topic0: str, from_block: str, to_block: str, addr_filter: Optional[str] = None) -> List[Dict[str, Any]]:
-    flt: Dict[str, Any] = {
-        "fromBlock": from_block,
-        "toBlock": to_block,
+def _hex_results(method: str, res: List[Any]) -> List[Any]:
+    out: List[Any] = []
+    for v in res:
+        if isinstance(v, Exception):
+            out.append(v)
+            continue
+        try:
+            out.append(int(v, 16) if v != "0x" else 0)
+        except (TypeError, ValueError):
+            out.append(RpcError({"code": -32603, "message": f"bad {method} result: {v!r}"}))
+    return out
+
+def evm_get_balances(url: str, addresses: List[str]) -> List[Any]:
+    # Same slot convention as rpc_batch: int balance in wei, or the exception for that address
+    res = rpc_batch(url, [("eth_getBalance", [a, "latest"]) for a in addresses], EVM_RPC_MAX_BATCH)
+    return _hex_results("eth_getBalance", res)
+
+def evm_get_balances_with_token(url: str, addresses: List[str], token: str) -> Tuple[List[Any], List[Any]]:
+    # native balances and ERC20 balanceOf(address) for every address, in one JSON-RPC batch
+    calls = [("eth_getBalance", [a, "latest"]) for a in addresses]
+    calls += [("eth_call", [{"to": token, "data": "0x70a08231" + "0" * 24 + a[2:].lower()}, "latest"]) for a in addresses]
+    res = rpc_batch(url, calls, EVM_RPC_MAX_BATCH)
+    n = len(addresses)
+    return _hex_results("eth_getBalance", res[:n]), _hex_results("eth_call", res[n:])
+
+def evm_block_number(url: str) -> int:
+    return int(evm_rpc(url, "eth_blockNumber", []), 16)
+
+def evm_resolve_block(url: str, tag: Optional[str]) -> int:
+    t = (tag or "latest").strip().lower()
+    if t in ("latest", "pending", "safe", "finalized"):
+        return evm_block_number(url)
+    if t == "earliest":
+        return 0
+    return int(t, 0)
+
+def evm_topic_address(addr: str) -> str:
+    return "0x" + "0" * 24 + addr[2:].lower()
+
+def _evm_log_filter(address_contract: str, topics: List[Any], from_block: Any, to_block: Any) -> Dict[str, Any]:
+    return {
+        "fromBlock": hex(from_block) if isinstance(from_block, int) else from_block,
+        "toBlock": hex(to_block) if isinstance(to_block, int) else to_block,
         "address": address_contract,
-        "topics": [topic0],
+        "topics": topics,
     }
+
+def evm_get_logs(url: str, address_contract: str, topic0: str, from_block: str, to_block: str, extra_topics: Optional[List[Any]] = None) -> List[Dict[str, Any]]:
+    flt = _evm_log_filter(address_contract, [topic0] + (extra_topics or []), from_block, to_block)
     return evm_rpc(url, "eth_getLogs", [flt]) or []
 
+_LOG_RANGE_ERRORS = ("more than", "too many", "too large", "limit exceeded", "exceed", "range", "response size", "timeout", "timed out")
+
+def _is_log_range_error(e: Exception) -> bool:
+    if isinstance(e, requests.Timeout):
+        return True
+    return isinstance(e, RpcError) and any(m in str(e).lower() for m in _LOG_RANGE_ERRORS)
+
+def evm_log_sort_key(L: Dict[str, Any]) -> Tuple[int, int]:
+    return int(L.get("blockNumber") or "0x0", 16), int(L.get("logIndex") or "0x0", 16)
+
+def evm_iter_log_chunks(
+    url: str,
+    address_contract: str,
+    topic_sets: List[List[Any]],
+    from_block: int,
+    to_block: int,
+) -> Iterator[Tuple[int, int, List[Dict[str, Any]]]]:
+    # Walks [from_block, to_block] newest-first in adaptive chunks; every topic set is queried
+    # per chunk within one JSON-RPC batch. Yields (lo, hi, logs) per completed chunk, with logs
+    # deduplicated by (txHash, logIndex) and in chain order. Stop early by closing the generator.
+    chunk = EVM_LOG_CHUNK_INITIAL
+    hi = to_block
+    while hi >= from_block:
+        lo = max(from_block, hi - chunk + 1)
+        calls = [("eth_getLogs", [_evm_log_filter(address_contract, t, lo, hi)]) for t in topic_sets]
+        res = rpc_batch(url, calls, EVM_RPC_MAX_BATCH)
+        errs = [r for r in res if isinstance(r, Exception)]
+        if errs:
+            if chunk > EVM_LOG_CHUNK_MIN and all(_is_log_range_error(e) for e in errs):
+                chunk = max(EVM_LOG_CHUNK_MIN, chunk // 2)
+                continue
+            raise errs[0]
+        found: Dict[Tuple[Any, Any], Dict[str, Any]] = {}
+        n = 0
+        for logs in res:
+            for L in logs or []:
+                found[(L.get("transactionHash"), L.get("logIndex"))] = L
+                n += 1
+        if n < EVM_LOG_CHUNK_GROW_BELOW:
+            chunk = min(EVM_LOG_CHUNK_MAX, chunk * 2)
+        yield lo, hi, sorted(found.values(), key=evm_log_sort_key)
+        hi = lo - 1
+
+def evm_scan_logs(url: str, address_contract: str, topic_sets: List[List[Any]], from_block: int, to_block: int) -> List[Dict[str, Any]]:
+    # every log of the range, in chain order
+    chunks = [logs for _, _, logs in evm_iter_log_chunks(url, address_contract, topic_sets, from_block, to_block)]
+    return [L for logs in reversed(chunks) for L in logs]
+
+def evm_transfer_parties(log: Dict[str, Any]) -> Tuple[str, ...]:
+    # lowercase from/to of a Transfer log, once each (a self-transfer yields one address)
+    topics = log.get("topics") or []
+    if len(topics) < 3:
+        return ()
+    return tuple(dict.fromkeys(("0x" + topics[1][-40:].lower(), "0x" + topics[2][-40:].lower())))
+
+def evm_usdt_topic_sets(chain_key: Literal["eth", "bsc"], addresses: List[str]) -> List[List[Any]]:
+    # outgoing (topic1) and incoming (topic2) transfers, addresses in OR-lists of up to EVM_LOG_ADDRESSES_PER_QUERY
+    topic0 = USDT[chain_key]["topic_transfer"]
+    topic_sets: List[List[Any]] = []
+    for i in range(0, len(addresses), EVM_LOG_ADDRESSES_PER_QUERY):
+        padded: Any = [evm_topic_address(a) for a in addresses[i:i + EVM_LOG_ADDRESSES_PER_QUERY]]
+        if len(padded) == 1:
+            padded = padded[0]
+        topic_sets += [[topic0, padded], [topic0, None, padded]]
+    return topic_sets
+
+def evm_split_transfers(logs: List[Dict[str, Any]], buckets: Dict[str, List[Dict[str, Any]]]) -> Set[str]:
+    # one pass: appends every log to the buckets of its from/to addresses, returns the addresses touched
+    touched = set()
+    for L in logs:
+        for a in evm_transfer_parties(L):
+            bucket = buckets.get(a)
+            if bucket is not None:
+                bucket.append(L)
+                touched.add(a)
+    return touched
+
+def evm_iter_usdt_transfers(
+    url: str,
+    chain_key: Literal["eth", "bsc"],
+    addresses: List[str],
+    from_block: int,
+    to_block: int,
+    limit: Optional[int] = None,
+) -> Iterator[Tuple[str, List[Dict[str, Any]]]]:
+    # Transfers of all addresses in one scan: each chunk queries OR-lists of the padded addresses,
+    # so upstream work scales with the block range and not with the address count. Yields
+    # (lowercase address, logs in chain order) as soon as an address is complete: once it has
+    # limit logs, otherwise when the scan ends. The scan stops when every address is complete.
+    addrs = list(dict.fromkeys(a.lower() for a in addresses))
+    if not addrs:
+        return
+    newest: Dict[str, List[Dict[str, Any]]] = {a: [] for a in addrs}
+    chunks = evm_iter_log_chunks(
+        url,
+        USDT[chain_key]["contract"],
+        evm_usdt_topic_sets(chain_key, addrs),
+        max(from_block, USDT[chain_key]["deploy_block"]),
+        to_block,
+    )
+    for _, _, logs in chunks:
+        touched = evm_split_transfers(logs[::-1], newest)
+        if limit is not None:
+            for a in touched:
+                if len(newest[a]) >= limit:
+                    yield a, newest.pop(a)[::-1]
+            if not newest:
+                chunks.close()
+                return
+    for a, logs in newest.items():
+        yield a, logs[::-1]
+
+def evm_scan_usdt_transfers_many(
+    url: str,
+    chain_key: Literal["eth", "bsc"],
+    addresses: List[str],
+    from_block: int,
+    to_block: int,
+    limit: Optional[int] = None,
+) -> Dict[str, List[Dict[str, Any]]]:
+    return dict(evm_iter_usdt_transfers(url, chain_key, addresses, from_block, to_block, limit))
+
+def evm_scan_usdt_transfers(url: str, chain_key: Literal["eth", "bsc"], address: str, from_block: int, to_block: int, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+    return evm_scan_usdt_transfers_many(url, chain_key, [address], from_block, to_block, limit)[address.lower()]
+
 # Solana RPC helpers
 def sol_rpc(method: str, params: list) -> Any:
-    payload = {"jsonrpc": "2.0", "id": 1, "method": method, "params": params}
-    r = request_with_retry("POST", SOL_RPC, HEADERS_RPC, json=payload, timeout=25)
-    r.raise_for_status()
-    j = r.json()
-    if "error" in j:
-        raise HTTPException(502, detail=j["error"])
-    return j.get("result")
+    return _rpc_call(SOL_RPC, method, params)
 
 def sol_get_signatures_for_address(addr: str, limit: int = 20, before: Optional[str] = None) -> List[Dict[str, Any]]:
     opts: Dict[str, Any] = {"limit": limit}
@@ -164,17 +1232,97 @@ def sol_get_signatures_for_address(addr: str, limit: int = 20, before: Optional[
         opts["before"] = before
     return sol_rpc("getSignaturesForAddress", [addr, opts]) or []
 
+_SOL_TX_OPTS = {"encoding": "jsonParsed", "maxSupportedTransactionVersion": 0, "commitment": "finalized"}
+
 def sol_get_transaction(sig: str) -> Dict[str, Any]:
-    return sol_rpc("getTransaction", [sig, {"encoding": "jsonParsed", "maxSupportedTransactionVersion": 0}]) or {}
+    return sol_rpc("getTransaction", [sig, _SOL_TX_OPTS]) or {}
+
+def sol_get_transactions(sigs: List[str]) -> List[Any]:
+    # rpc_batch slot convention: tx dict ({} when not found) or the exception for that signature
+    res = rpc_batch(SOL_RPC, [("getTransaction", [sig, _SOL_TX_OPTS]) for sig in sigs], SOL_RPC_MAX_BATCH)
+    return [r if isinstance(r, Exception) else (r or {}) for r in res]
 
 def sol_get_token_accounts_by_owner(owner: str, mint: str) -> List[str]:
     res = sol_rpc("getTokenAccountsByOwner", [owner, {"mint": mint}, {"encoding": "jsonParsed"}])
     vals = (res or {}).get("value", []) if isinstance(res, dict) else []
     return [v.get("pubkey") for v in vals if isinstance(v, dict) and v.get("pubkey")]
 
+def sol_get_multiple_accounts(keys: List[str]) -> Dict[str, Any]:
+    # account dict (None if it does not exist) per key, or the exception that failed its chunk;
+    # all getMultipleAccounts calls go out in one JSON-RPC batch
+    keys = list(dict.fromkeys(keys))
+    chunks = [keys[i:i + SOL_MULTIPLE_ACCOUNTS_MAX] for i in range(0, len(keys), SOL_MULTIPLE_ACCOUNTS_MAX)]
+    res = rpc_batch(SOL_RPC, [("getMultipleAccounts", [c, {"encoding": "base64"}]) for c in chunks], SOL_RPC_MAX_BATCH)
+    out: Dict[str, Any] = {}
+    for chunk, r in zip(chunks, res):
+        vals = (r or {}).get("value") if isinstance(r, dict) else None
+        if not isinstance(r, Exception) and (not isinstance(vals, list) or len(vals) != len(chunk)):
+            r = RpcError({"code": -32603, "message": "bad getMultipleAccounts result"})
+        out.update(dict.fromkeys(chunk, r) if isinstance(r, Exception) else zip(chunk, vals))
+    return out
+
+def spl_token_amount(account: Optional[Dict[str, Any]], mint: str) -> int:
+    # amount of a base64-encoded SPL token account (layout: mint 32 | owner 32 | amount u64 LE | ...)
+    if not account or account.get("owner") != SPL_TOKEN_PROGRAM:
+        return 0
+    data = base64.b64decode((account.get("data") or [""])[0])
+    if len(data) < 72 or data[:32] != b58decode(mint):
+        return 0
+    return int.from_bytes(data[64:72], "little")
+
+# base58 and program-derived addresses (associated token accounts are derived locally)
+_B58_ALPHABET = "123456789ABCDEFGHJKLMNPQRSTUVWXYZabcdefghijkmnopqrstuvwxyz"
+_B58_INDEX = {c: i for i, c in enumerate(_B58_ALPHABET)}
+_ED25519_P = 2 ** 255 - 19
+_ED25519_D = -121665 * pow(121666, -1, _ED25519_P) % _ED25519_P
+
+def b58decode(s: str) -> bytes:
+    n = 0
+    try:
+        for c in s:
+            n = n * 58 + _B58_INDEX[c]
+    except KeyError:
+        raise ValueError(f"invalid base58: {s!r}")
+    return b"\0" * (len(s) - len(s.lstrip("1"))) + n.to_bytes((n.bit_length() + 7) // 8, "big")
+
+def b58encode(b: bytes) -> str:
+    n = int.from_bytes(b, "big")
+    out = []
+    while n:
+        n, r = divmod(n, 58)
+        out.append(_B58_ALPHABET[r])
+    return "1" * (len(b) - len(b.lstrip(b"\0"))) + "".join(reversed(out))
+
+def sol_pubkey_bytes(addr: str) -> bytes:
+    raw = b58decode(addr)
+    if len(raw) != 32:
+        raise ValueError(f"not a 32-byte public key: {addr!r}")
+    return raw
+
+def _on_ed25519_curve(b: bytes) -> bool:
+    # whether the 32 bytes decompress to an ed25519 point (x^2 = (y^2 - 1) / (d y^2 + 1) has a root)
+    p = _ED25519_P
+    y = int.from_bytes(b, "little") & ((1 << 255) - 1)
+    y2 = y * y % p
+    x2 = (y2 - 1) * pow(_ED25519_D * y2 + 1, p - 2, p) % p
+    return x2 == 0 or pow(x2, (p - 1) // 2, p) == 1
+
+def sol_find_program_address(seeds: List[bytes], program_id: bytes) -> bytes:
+    for bump in range(255, -1, -1):
+        h = hashlib.sha256(b"".join(seeds) + bytes([bump]) + program_id + b"ProgramDerivedAddress").digest()
+        if not _on_ed25519_curve(h):
+            return h
+    raise ValueError("no off-curve program address")
+
+def sol_derive_ata(owner: str, mint: str) -> str:
+    seeds = [sol_pubkey_bytes(owner), sol_pubkey_bytes(SPL_TOKEN_PROGRAM), sol_pubkey_bytes(mint)]
+    return b58encode(sol_find_program_address(seeds, sol_pubkey_bytes(SPL_ATA_PROGRAM)))
+
 def sol_find_ata(owner: str, mint: str) -> str:
-    accs = sol_get_token_accounts_by_owner(owner, mint)
-    return accs[0] if accs else ""
+    try:
+        return get_ata_cache().resolve(owner, mint)
+    except ValueError:
+        return ""
 
 # =========================
 # MODELS
@@ -184,28 +1332,43 @@ class AddressBody(BaseModel):
 
 class AddressesBody(BaseModel):
     addresses: List[str] = Field(..., min_length=1, max_length=100)
+    max_age: Optional[float] = Field(None, ge=0)   # seconds; 0 = always fetch fresh
+    include_tokens: bool = False                   # also return USDT balances in `tokens`
+
+class PortfolioBody(BaseModel):
+    addresses: List[str] = Field(..., min_length=1, max_length=100)
+    max_age: Optional[float] = Field(None, ge=0)
+    include_tokens: bool = True
 
 class EthHistoryBody(BaseModel):
     address: str
     from_block: Optional[str] = "0x0"
     to_block: Optional[str] = "latest"
     limit_logs: int = Field(2000, ge=1, le=5000)
+    output: Literal["raw", "decoded"] = "raw"      # decoded: from/to/amount/direction instead of data/topics
+    layout: Literal["rows", "columns"] = "rows"    # columns: results is {field: [values...]}
 
 class EthHistoryBatchBody(BaseModel):
     addresses: List[str] = Field(..., min_length=1, max_length=100)
     from_block: Optional[str] = "0x0"
     to_block: Optional[str] = "latest"
     limit_logs: int = Field(2000, ge=1, le=5000)
+    output: Literal["raw", "decoded"] = "raw"
+    layout: Literal["rows", "columns"] = "rows"
+    stream: bool = False   # NDJSON: one record per address as it completes, then a trailer
 
 class TronHistoryBatchBody(BaseModel):
     addresses: List[str] = Field(..., min_length=1, max_length=100)
     page_size: int = Field(50, ge=1, le=200)
     next_page: Optional[str] = None
+    cursors: Optional[Dict[str, str]] = None   # per-address `next` tokens; overrides next_page
+    stream: bool = False
 
 class BtcHistoryBatchBody(BaseModel):
     addresses: List[str] = Field(..., min_length=1, max_length=100)
     page_size: int = Field(50, ge=1, le=200)
     offset: int = Field(0, ge=0)
+    stream: bool = False
 
 class SolanaHistoryBatchBody(BaseModel):
     addresses: List[str] = Field(..., min_length=1, max_length=100)
@@ -213,6 +1376,27 @@ class SolanaHistoryBatchBody(BaseModel):
     before: Optional[str] = None                   
     only_token_transfers: bool = False             
     only_usdt: bool = False                        
+    stream: bool = False
+
+class HistoryExportBody(BaseModel):
+    addresses: List[str] = Field(..., min_length=1, max_length=100)
+    page_size: int = Field(50, ge=1, le=200)
+    cursors: Optional[Dict[str, str]] = None       # resume cursors from a previous export, per address
+    since_time: Optional[int] = Field(None, ge=0)  # unix seconds; stop at older items
+    since_block: Optional[int] = Field(None, ge=0) # block number (slot on Solana); stop at older items
+    max_items: int = Field(10000, ge=1, le=100000) # per address
+
+class SolanaHistoryExportBody(HistoryExportBody):
+    page_size: int = Field(50, ge=1, le=100)
+    only_token_transfers: bool = False
+    only_usdt: bool = False
+
+class WatchSubscriptionBody(BaseModel):
+    chain: Literal["eth", "bsc"]
+    addresses: List[str] = Field(..., min_length=1, max_length=1000)
+    url: str
+    secret: Optional[str] = None                  # HMAC-SHA256 key for X-Webhook-Signature
+    from_block: Optional[int] = Field(None, ge=0) # default: current confirmed head
 
 class NativeBalance(BaseModel):
     chain: Literal["btc", "eth", "bsc", "tron", "sol"]
@@ -234,178 +1418,1034 @@ class BalanceResponse(BaseModel):
     error_detail: Optional[str] = None
     timestamp: str
 
+# Hot-path record with the BalanceResponse shape: no validation on construction,
+# to_dict() yields plain JSON-ready dicts
+class BalanceResult:
+    __slots__ = ("status", "address", "native", "tokens", "error_detail", "timestamp")
+
+    def __init__(
+        self,
+        status: Literal["ok", "error"],
+        address: str,
+        native: Optional[Dict[str, Any]] = None,
+        tokens: Optional[List[Dict[str, Any]]] = None,
+        error_detail: Optional[str] = None,
+        timestamp: Optional[str] = None,
+    ):
+        self.status = status
+        self.address = address
+        self.native = native
+        self.tokens = tokens
+        self.error_detail = error_detail
+        self.timestamp = timestamp or utc_now()
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "status": self.status,
+            "address": self.address,
+            "native": self.native,
+            "tokens": self.tokens,
+            "error_detail": self.error_detail,
+            "timestamp": self.timestamp,
+        }
+
+def native_balance(chain: str, value: str, raw: Any = None) -> Dict[str, Any]:
+    return {"chain": chain, "value": value, "raw": raw}
+
+# =========================
+# BALANCE CACHE
+# =========================
+class _Flight:
+    __slots__ = ("started", "done", "value", "error")
+
+    def __init__(self, started: float):
+        self.started = started
+        self.done = threading.Event()
+        self.value: Any = None
+        self.error: Optional[Exception] = None
+
+class BalanceCache:
+    # Per-(chain, address) TTL cache with single-flight loading: while an upstream lookup for a
+    # key is running, other requests for that key wait for it instead of issuing their own.
+    # Only status="ok" responses are stored.
+    def __init__(self, max_items: int):
+        self.max_items = max_items
+        self._entries: Dict[Tuple[str, str, str], Tuple[float, Any]] = {}
+        self._flights: Dict[Tuple[str, str, str], _Flight] = {}
+        self._lock = threading.Lock()
+        self._counters = {"hits": 0, "misses": 0, "coalesced": 0}
+
+    def load_many(
+        self,
+        chain: str,
+        addresses: List[str],
+        loader: Callable[[List[str]], List[Any]],
+        max_age: Optional[float] = None,
+        variant: str = "",
+    ) -> List[Any]:
+        # `variant` separates differently shaped results for the same address (e.g. with tokens)
+        ttl = BALANCE_TTL.get(chain, 0.0)
+        fresh_for = ttl if max_age is None else min(ttl, max_age)
+        now = time.monotonic()
+        out: Dict[str, Any] = {}
+        mine: Dict[str, _Flight] = {}
+        theirs: Dict[str, _Flight] = {}
+        with self._lock:
+            for a in dict.fromkeys(addresses):
+                key = (chain, variant, a)
+                hit = self._entries.get(key)
+                if hit is not None and now - hit[0] <= fresh_for:
+                    out[a] = hit[1]
+                    self._counters["hits"] += 1
+                    continue
+                f = self._flights.get(key)
+                if f is not None and (max_age is None or f.started >= now - max_age):
+                    theirs[a] = f
+                    self._counters["coalesced"] += 1
+                    continue
+                f = _Flight(now)
+                self._flights[key] = f
+                mine[a] = f
+                self._counters["misses"] += 1
+
+        if mine:
+            keys = list(mine)
+            try:
+                values = loader(keys)
+            except Exception as e:
+                self._finish(chain, variant, mine, None, e, ttl)
+                raise
+            self._finish(chain, variant, mine, values, None, ttl)
+            out.update(zip(keys, values))
+
+        for a, f in theirs.items():
+            f.done.wait()
+            if f.error is not None:
+                raise f.error
+            out[a] = f.value
+        return [out[a] for a in addresses]
+
+    def _finish(self, chain: str, variant: str, flights: Dict[str, _Flight], values: Optional[List[Any]], error: Optional[Exception], ttl: float) -> None:
+        stored_at = time.monotonic()
+        with self._lock:
+            for i, (a, f) in enumerate(flights.items()):
+                key = (chain, variant, a)
+                if self._flights.get(key) is f:
+                    del self._flights[key]
+                if values is None:
+                    continue
+                v = values[i]
+                if ttl > 0 and getattr(v, "status", None) == "ok":
+                    self._entries.pop(key, None)
+                    self._entries[key] = (stored_at, v)
+            while len(self._entries) > self.max_items:
+                del self._entries[next(iter(self._entries))]
+        for i, f in enumerate(flights.values()):
+            f.error = error
+            f.value = values[i] if values is not None else None
+            f.done.set()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return dict(self._counters, items=len(self._entries), in_flight=len(self._flights))
+
+balance_cache = BalanceCache(BALANCE_CACHE_MAX_ITEMS)
+
 # =========================
 # BALANCES (batch)
 # =========================
-def _balance_eth_one(address: str) -> BalanceResponse:
-    if not is_evm_address(address):
-        return BalanceResponse(status="error", address=address, error_detail="Invalid ETH address", timestamp=utc_now())
-    try:
-        wei = evm_get_balance(ETH_RPC, address)
-        return BalanceResponse(
-            status="ok",
-            address=address,
-            native=NativeBalance(chain="eth", value=fmt_decimal(from_units(wei, 18))),
-            timestamp=utc_now(),
-        )
-    except requests.RequestException as e:
-        return BalanceResponse(status="error", address=address, error_detail=f"ETH RPC error: {e}", timestamp=utc_now())
+def usdt_token(chain: Literal["eth", "bsc", "tron", "sol"], raw: int) -> Dict[str, Any]:
+    spec = USDT[chain]
+    return {
+        "chain": chain,
+        "contract_or_mint": spec.get("contract") or spec.get("mint"),
+        "symbol": "USDT",
+        "decimals": spec["decimals"],
+        "amount": format_units(raw, spec["decimals"]),
+    }
 
-def _balance_bsc_one(address: str) -> BalanceResponse:
-    if not is_evm_address(address):
-        return BalanceResponse(status="error", address=address, error_detail="Invalid BSC address", timestamp=utc_now())
-    try:
-        wei = evm_get_balance(BSC_RPC, address)
-        return BalanceResponse(
+@instrumented("balance_evm")
+def _balance_evm_many(url_rpc: str, chain_key: Literal["eth", "bsc"], addresses: List[str], include_tokens: bool = False) -> List[BalanceResult]:
+    valid = list(dict.fromkeys(a for a in addresses if is_evm_address(a)))
+    if include_tokens:
+        natives, usdt = evm_get_balances_with_token(url_rpc, valid, USDT[chain_key]["contract"])
+        tokens = dict(zip(valid, usdt))
+    else:
+        natives, tokens = evm_get_balances(url_rpc, valid), {}
+    balances = dict(zip(valid, natives))
+    out: List[BalanceResult] = []
+    for a in addresses:
+        if a not in balances:
+            out.append(BalanceResult(status="error", address=a, error_detail=f"Invalid {chain_key.upper()} address", timestamp=utc_now()))
+            continue
+        wei, tok = balances[a], tokens.get(a)
+        err = wei if isinstance(wei, Exception) else tok if isinstance(tok, Exception) else None
+        if err is not None:
+            out.append(BalanceResult(status="error", address=a, error_detail=f"{chain_key.upper()} RPC error: {err}", timestamp=utc_now()))
+            continue
+        out.append(BalanceResult(
             status="ok",
-            address=address,
-            native=NativeBalance(chain="bsc", value=fmt_decimal(from_units(wei, 18))),
+            address=a,
+            native=native_balance(chain_key, format_units(wei, NATIVE_DECIMALS[chain_key])),
+            tokens=[usdt_token(chain_key, tok)] if include_tokens else None,
             timestamp=utc_now(),
-        )
-    except requests.RequestException as e:
-        return BalanceResponse(status="error", address=address, error_detail=f"BSC RPC error: {e}", timestamp=utc_now())
+        ))
+    return out
+
+def _tron_trc20_amount(j: Dict[str, Any], contract: str) -> int:
+    # Tatum account payload: "trc20": [{"<contract>": "<amount in base units>"}, ...]
+    src = j.get("data") if isinstance(j.get("data"), dict) else j
+    for entry in src.get("trc20") or []:
+        if isinstance(entry, dict) and contract in entry:
+            return int(entry[contract] or 0)
+    return 0
 
-def _balance_tron_one(address: str) -> BalanceResponse:
+@instrumented("balance_tron")
+def _balance_tron_one(address: str, include_tokens: bool = False) -> BalanceResult:
     if not is_tron_address(address):
-        return BalanceResponse(status="error", address=address, error_detail="Invalid TRON address", timestamp=utc_now())
+        return BalanceResult(status="error", address=address, error_detail="Invalid TRON address", timestamp=utc_now())
     try:
-        url = f"https://api.tatum.io/v3/tron/account/{address}"
+        url = f"{TATUM_API}/v3/tron/account/{address}"
         r = request_with_retry("GET", url, HEADERS_JSON, timeout=20)
         r.raise_for_status()
         j = r.json()
-        bal = 0.0
+        dec = NATIVE_DECIMALS["tron"]
+        bal = 0
         try:
             data = j.get("data") or {}
-            bal = float(data.get("balance", 0)) if isinstance(data, dict) else float(j.get("balance", 0))
+            bal = parse_units(data.get("balance", 0), dec) if isinstance(data, dict) else parse_units(j.get("balance", 0), dec)
         except Exception:
-            bal = float(j.get("balance", 0) or 0)
-        return BalanceResponse(
+            bal = parse_units(j.get("balance", 0) or 0, dec)
+        return BalanceResult(
             status="ok",
             address=address,
-            native=NativeBalance(chain="tron", value=fmt_decimal(bal)),
+            native=native_balance("tron", format_units(bal, dec)),
+            tokens=[usdt_token("tron", _tron_trc20_amount(j, USDT["tron"]["contract"]))] if include_tokens else None,
             timestamp=utc_now(),
         )
     except requests.RequestException as e:
-        return BalanceResponse(status="error", address=address, error_detail=f"TRON API error: {e}", timestamp=utc_now())
+        return BalanceResult(status="error", address=address, error_detail=f"TRON API error: {e}", timestamp=utc_now())
 
-def _balance_btc_one(address: str) -> BalanceResponse:
+@instrumented("balance_btc")
+def _balance_btc_one(address: str, include_tokens: bool = False) -> BalanceResult:
+    # no USDT on BTC: include_tokens is accepted for a uniform signature
     if not is_btc_address(address):
-        return BalanceResponse(status="error", address=address, error_detail="Invalid BTC address", timestamp=utc_now())
+        return BalanceResult(status="error", address=address, error_detail="Invalid BTC address", timestamp=utc_now())
     try:
-        url = f"https://api.tatum.io/v3/bitcoin/address/balance/{address}"
+        url = f"{TATUM_API}/v3/bitcoin/address/balance/{address}"
         r = request_with_retry("GET", url, HEADERS_JSON, timeout=20)
         r.raise_for_status()
         j = r.json() or {}
-        bal = float(j.get("incoming", 0)) - float(j.get("outgoing", 0))
-        return BalanceResponse(
+        dec = NATIVE_DECIMALS["btc"]
+        bal = parse_units(j.get("incoming", 0), dec) - parse_units(j.get("outgoing", 0), dec)
+        return BalanceResult(
             status="ok",
             address=address,
-            native=NativeBalance(chain="btc", value=fmt_decimal(bal)),
-            raw=j,
+            native=native_balance("btc", format_units(bal, dec)),
             timestamp=utc_now(),
         )
     except requests.RequestException as e:
-        return BalanceResponse(status="error", address=address, error_detail=f"BTC API error: {e}", timestamp=utc_now())
+        return BalanceResult(status="error", address=address, error_detail=f"BTC API error: {e}", timestamp=utc_now())
 
-def _balance_solana_one(address: str) -> BalanceResponse:
-    if not is_solana_address(address):
-        return BalanceResponse(status="error", address=address, error_detail="Invalid Solana address", timestamp=utc_now())
-    try:
-        url = f"https://api.tatum.io/v3/solana/account/balance/{address}"
-        r = request_with_retry("GET", url, HEADERS_JSON, timeout=20)
-        r.raise_for_status()
-        j = r.json() or {}
-        bal = float(j.get("balance", 0)) if isinstance(j, dict) else 0.0
-        return BalanceResponse(
+@instrumented("balance_sol")
+def _balance_solana_many(addresses: List[str], include_tokens: bool = False) -> List[BalanceResult]:
+    # native lamports and the USDT associated token account of every address through
+    # getMultipleAccounts: ceil(keys / 100) calls, sent as one JSON-RPC batch
+    mint = USDT["sol"]["mint"]
+    valid: List[str] = []
+    for a in dict.fromkeys(addresses):
+        try:
+            if is_solana_address(a) and sol_pubkey_bytes(a):
+                valid.append(a)
+        except ValueError:
+            pass
+    atas = dict(zip(valid, get_ata_cache().resolve_many(valid, mint))) if include_tokens else {}
+    accounts = sol_get_multiple_accounts(valid + list(atas.values()))
+    dec = NATIVE_DECIMALS["sol"]
+    out: List[BalanceResult] = []
+    for a in addresses:
+        if a not in accounts:
+            out.append(BalanceResult(status="error", address=a, error_detail="Invalid Solana address", timestamp=utc_now()))
+            continue
+        acc, tok = accounts[a], accounts.get(atas.get(a, ""))
+        err = acc if isinstance(acc, Exception) else tok if isinstance(tok, Exception) else None
+        if err is not None:
+            out.append(BalanceResult(status="error", address=a, error_detail=f"SOL RPC error: {err}", timestamp=utc_now()))
+            continue
+        out.append(BalanceResult(
             status="ok",
-            address=address,
-            native=NativeBalance(chain="sol", value=fmt_decimal(bal)),
+            address=a,
+            native=native_balance("sol", format_units((acc or {}).get("lamports") or 0, dec)),
+            tokens=[usdt_token("sol", spl_token_amount(tok, mint))] if include_tokens else None,
             timestamp=utc_now(),
-        )
-    except requests.RequestException as e:
-        return BalanceResponse(status="error", address=address, error_detail=f"SOL API error: {e}", timestamp=utc_now())
+        ))
+    return out
 
-def _run_batch(addresses: List[str], fn: Callable[[str], BalanceResponse]) -> Dict[str, Any]:
-    results: List[BalanceResponse] = []
-    for a in addresses:
-        results.append(fn(a))
-    return {"status": "ok", "count": len(results), "results": [r.dict() for r in results], "timestamp": utc_now()}
+def _balance_error(address: str, e: Exception) -> BalanceResult:
+    return BalanceResult(status="error", address=address, error_detail=f"Unexpected error: {error_text(e)}", timestamp=utc_now())
+
+def _batch_response(results: List[BalanceResult]) -> FastJSONResponse:
+    observe_batch(len(results))
+    return FastJSONResponse({"status": "ok", "count": len(results), "results": [r.to_dict() for r in results], "timestamp": utc_now()})
+
+_BALANCE_ONE: Dict[str, Callable[[str, bool], BalanceResult]] = {
+    "tron": _balance_tron_one,
+    "btc": _balance_btc_one,
+}
+
+def load_balances(chain: str, addresses: List[str], include_tokens: bool, max_age: Optional[float]) -> List[BalanceResult]:
+    if chain in ("eth", "bsc"):
+        url = ETH_RPC if chain == "eth" else BSC_RPC
+        loader = lambda keys: _balance_evm_many(url, chain, keys, include_tokens)
+    elif chain == "sol":
+        loader = lambda keys: _balance_solana_many(keys, include_tokens)
+    else:
+        fn = _BALANCE_ONE[chain]
+        loader = lambda keys: fan_out(keys, lambda a: fn(a, include_tokens), "tatum", _balance_error)
+    return balance_cache.load_many(chain, addresses, loader, max_age, "tokens" if include_tokens else "")
 
 @app.post("/eth/balance_batch")
 def eth_balance_batch(body: AddressesBody):
-    return _run_batch(body.addresses, _balance_eth_one)
+    return _batch_response(load_balances("eth", body.addresses, body.include_tokens, body.max_age))
 
 @app.post("/bsc/balance_batch")
 def bsc_balance_batch(body: AddressesBody):
-    return _run_batch(body.addresses, _balance_bsc_one)
+    return _batch_response(load_balances("bsc", body.addresses, body.include_tokens, body.max_age))
 
 @app.post("/tron/balance_batch")
 def tron_balance_batch(body: AddressesBody):
-    return _run_batch(body.addresses, _balance_tron_one)
+    return _batch_response(load_balances("tron", body.addresses, body.include_tokens, body.max_age))
 
 @app.post("/btc/balance_batch")
 def btc_balance_batch(body: AddressesBody):
-    return _run_batch(body.addresses, _balance_btc_one)
+    return _batch_response(load_balances("btc", body.addresses, body.include_tokens, body.max_age))
 
 @app.post("/solana/balance_batch")
 def solana_balance_batch(body: AddressesBody):
-    return _run_batch(body.addresses, _balance_solana_one)
+    return _batch_response(load_balances("sol", body.addresses, body.include_tokens, body.max_age))
+
+# =========================
+# PORTFOLIO (mixed chains)
+# =========================
+_dispatch_pool = ThreadPoolExecutor(max_workers=PORTFOLIO_POOL_SIZE, thread_name_prefix="dispatch")
+
+def detect_chains(addr: str) -> List[str]:
+    # EVM addresses are valid on both ETH and BSC; base58 strings can pass both the BTC and
+    # Solana validators, so legacy BTC (1.../3..., <= 35 chars) is tried first
+    if is_evm_address(addr):
+        return ["eth", "bsc"]
+    if is_tron_address(addr):
+        return ["tron"]
+    if _bech32_re.fullmatch(addr) or (is_btc_address(addr) and addr[0] in "13" and len(addr) <= 35):
+        return ["btc"]
+    if is_solana_address(addr):
+        return ["sol"]
+    if is_btc_address(addr):
+        return ["btc"]
+    return []
+
+@app.post("/portfolio")
+def portfolio(body: PortfolioBody):
+    observe_batch(len(body.addresses))
+    detected = {a: detect_chains(a) for a in dict.fromkeys(body.addresses)}
+    per_chain: Dict[str, List[str]] = {}
+    for a, chains in detected.items():
+        for c in chains:
+            per_chain.setdefault(c, []).append(a)
+
+    futures = {
+        c: submit_ctx(_dispatch_pool, load_balances, c, addrs, body.include_tokens, body.max_age)
+        for c, addrs in per_chain.items()
+    }
+    by_key: Dict[Tuple[str, str], BalanceResult] = {}
+    for c, fut in futures.items():
+        try:
+            res = fut.result()
+        except Exception as e:
+            res = [_balance_error(a, e) for a in per_chain[c]]
+        for a, r in zip(per_chain[c], res):
+            by_key[(c, a)] = r
+
+    results = []
+    for a in body.addresses:
+        chains = detected[a]
+        if not chains:
+            results.append({"status": "error", "address": a, "chains": [], "holdings": [], "error_detail": "Unrecognized address format", "timestamp": utc_now()})
+            continue
+        holdings = []
+        for c in chains:
+            r = by_key[(c, a)]
+            holdings.append({"chain": c, "status": r.status, "native": r.native, "tokens": r.tokens, "error_detail": r.error_detail, "timestamp": r.timestamp})
+        ok = any(h["status"] == "ok" for h in holdings)
+        results.append({"status": "ok" if ok else "error", "address": a, "chains": chains, "holdings": holdings, "timestamp": utc_now()})
+    return FastJSONResponse({"status": "ok", "count": len(results), "results": results, "timestamp": utc_now()})
+
+# =========================
+# LOG INDEX (USDT ETH/BSC)
+# =========================
+class UsdtLogIndex:
+    # Decoded USDT Transfer events keyed by (chain, address, block, log_index). Every indexed
+    # address covers one contiguous block range [low_block, synced_block]. A sync refreshes the
+    # blocks after synced_block, plus the last EVM_REORG_WINDOW blocks, which are replaced so
+    # reorged-out logs disappear, then extends low_block downwards only as far as the query
+    # needs: to its from_block, or until it has `limit` transfers. Each scanned chunk is
+    # committed on its own, so an interrupted backfill keeps its progress. At most
+    # LOG_INDEX_MAX_ADDRESSES addresses are kept, evicting the least recently queried.
+    def __init__(self, path: str):
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._lock = threading.Lock()
+        # per-address sync lock and its number of holders/waiters; dropped when that reaches 0
+        self._sync_locks: Dict[Tuple[str, str], List[Any]] = {}
+        with self._lock:
+            self._db.executescript("""
+                PRAGMA journal_mode=WAL;
+                CREATE TABLE IF NOT EXISTS transfers (
+                    chain TEXT NOT NULL,
+                    address TEXT NOT NULL,
+                    block INTEGER NOT NULL,
+                    log_index INTEGER NOT NULL,
+                    tx_hash TEXT NOT NULL,
+                    from_addr TEXT NOT NULL,
+                    to_addr TEXT NOT NULL,
+                    amount TEXT NOT NULL,
+                    data TEXT NOT NULL,
+                    contract TEXT NOT NULL,
+                    PRIMARY KEY (chain, address, block, log_index)
+                );
+                CREATE TABLE IF NOT EXISTS cursors (
+                    chain TEXT NOT NULL,
+                    address TEXT NOT NULL,
+                    synced_block INTEGER NOT NULL,
+                    PRIMARY KEY (chain, address)
+                );
+            """)
+            # indexes created before low_block existed were synced from the deploy block (NULL)
+            if "low_block" not in [r[1] for r in self._db.execute("PRAGMA table_info(cursors)")]:
+                self._db.execute("ALTER TABLE cursors ADD COLUMN low_block INTEGER")
+            if "last_queried" not in [r[1] for r in self._db.execute("PRAGMA table_info(cursors)")]:
+                self._db.execute("ALTER TABLE cursors ADD COLUMN last_queried REAL")
+            self._db.execute("CREATE INDEX IF NOT EXISTS cursors_last_queried ON cursors (last_queried)")
+            self._db.commit()
+
+    def _acquire(self, chain: str, addrs: List[str]) -> None:
+        # addrs sorted, so concurrent syncs lock in the same order
+        for a in addrs:
+            with self._lock:
+                entry = self._sync_locks.setdefault((chain, a), [threading.Lock(), 0])
+                entry[1] += 1
+            entry[0].acquire()
+
+    def _release(self, chain: str, addrs: List[str]) -> None:
+        for a in reversed(addrs):
+            with self._lock:
+                entry = self._sync_locks[(chain, a)]
+                entry[0].release()
+                entry[1] -= 1
+                if entry[1] == 0:
+                    del self._sync_locks[(chain, a)]
+
+    def coverage(self, chain: Literal["eth", "bsc"], address: str) -> Optional[Tuple[int, int]]:
+        # (low_block, synced_block) of the indexed range, None if the address is not indexed
+        with self._lock:
+            row = self._db.execute(
+                "SELECT low_block, synced_block FROM cursors WHERE chain = ? AND address = ?", (chain, address.lower())
+            ).fetchone()
+        if row is None:
+            return None
+        return (USDT[chain]["deploy_block"] if row[0] is None else row[0]), row[1]
+
+    def _count(self, chain: str, address: str, from_block: int, to_block: int) -> int:
+        with self._lock:
+            return self._db.execute(
+                "SELECT COUNT(*) FROM transfers WHERE chain = ? AND address = ? AND block >= ? AND block <= ?",
+                (chain, address, from_block, to_block),
+            ).fetchone()[0]
+
+    def iter_sync(
+        self,
+        url: str,
+        chain: Literal["eth", "bsc"],
+        addresses: List[str],
+        from_block: int,
+        to_block: int,
+        limit: Optional[int] = None,
+    ) -> Iterator[str]:
+        # Yields each address once query(from_block, to_block, limit) is exact for it; its sync
+        # lock is still held while the caller runs at the yield. Addresses sharing a start block
+        # are scanned together with one OR-list scan: upwards, the group with the lowest start
+        # runs up to the next start and then merges with it; downwards, the group with the
+        # highest low_block runs down to the next one. Each block range is fetched once.
+        addrs = sorted(set(a.lower() for a in addresses))
+        self._acquire(chain, addrs)
+        try:
+            floor = max(from_block, USDT[chain]["deploy_block"])
+            cov = {a: self.coverage(chain, a) for a in addrs}
+            for a, c in cov.items():
+                if c is not None and to_block - c[1] > LOG_INDEX_MAX_GAP:
+                    self._drop(chain, a)
+                    cov[a] = None
+            starts = {}
+            for a, c in cov.items():
+                if c is not None and to_block > c[1] - EVM_REORG_WINDOW[chain]:
+                    starts[a] = max(c[0], c[1] - EVM_REORG_WINDOW[chain] + 1)
+            while starts:
+                low = min(starts.values())
+                group = [a for a, s in starts.items() if s == low]
+                hi = min([to_block] + [s - 1 for s in starts.values() if s > low])
+                self._store(chain, evm_scan_usdt_transfers_many(url, chain, group, low, hi), low, hi, cov)
+                for a in group:
+                    if hi >= to_block:
+                        del starts[a]
+                    else:
+                        starts[a] = hi + 1
+
+            tops: Dict[str, int] = {}
+            need: Dict[str, float] = {}
+            for a, c in cov.items():
+                if c is None:
+                    tops[a], need[a] = to_block, limit or float("inf")
+                elif c[0] > floor:
+                    have = self._count(chain, a, max(from_block, c[0]), min(to_block, c[1]))
+                    if limit is None or have < limit:
+                        tops[a], need[a] = c[0] - 1, (limit - have) if limit else float("inf")
+            for a in addrs:
+                if a not in tops:
+                    yield a
+            while tops:
+                top = max(tops.values())
+                if top < floor:
+                    yield from list(tops)
+                    break
+                group = [a for a, t in tops.items() if t == top]
+                bottom = max([floor] + [t + 1 for t in tops.values() if t < top])
+                buckets: Dict[str, List[Dict[str, Any]]] = {a: [] for a in group}
+                chunks = evm_iter_log_chunks(url, USDT[chain]["contract"], evm_usdt_topic_sets(chain, group), bottom, top)
+                for lo, hi, logs in chunks:
+                    for bucket in buckets.values():
+                        bucket.clear()
+                    evm_split_transfers(logs, buckets)
+                    self._store(chain, buckets, lo, hi, cov)
+                    done = []
+                    for a, bucket in buckets.items():
+                        if a in tops:
+                            need[a] -= sum(1 for L in bucket if int(L["blockNumber"], 16) <= to_block)
+                            if need[a] <= 0:
+                                del tops[a]
+                                done.append(a)
+                    yield from done
+                    if not any(a in tops for a in group):
+                        chunks.close()
+                        break
+                for a in group:
+                    if a in tops:
+                        if bottom <= floor:
+                            del tops[a]
+                            yield a
+                        else:
+                            tops[a] = bottom - 1
+            self._evict()
+        finally:
+            self._release(chain, addrs)
+
+    def _evict(self) -> None:
+        # addresses being synced are skipped; they are evicted by a later sync if still the oldest
+        with self._lock, self._db:
+            excess = self._db.execute("SELECT COUNT(*) FROM cursors").fetchone()[0] - LOG_INDEX_MAX_ADDRESSES
+            if excess <= 0:
+                return
+            rows = self._db.execute(
+                "SELECT chain, address FROM cursors ORDER BY last_queried LIMIT ?", (excess + len(self._sync_locks),)
+            ).fetchall()
+            victims = [r for r in rows if r not in self._sync_locks][:excess]
+            self._db.executemany("DELETE FROM transfers WHERE chain = ? AND address = ?", victims)
+            self._db.executemany("DELETE FROM cursors WHERE chain = ? AND address = ?", victims)
+
+    def _drop(self, chain: str, address: str) -> None:
+        with self._lock, self._db:
+            self._db.execute("DELETE FROM transfers WHERE chain = ? AND address = ?", (chain, address))
+            self._db.execute("DELETE FROM cursors WHERE chain = ? AND address = ?", (chain, address))
+
+    def _store(
+        self,
+        chain: str,
+        by_addr: Dict[str, List[Dict[str, Any]]],
+        start: int,
+        end: int,
+        cov: Dict[str, Optional[Tuple[int, int]]],
+    ) -> None:
+        # replaces [start, end] of every address and widens its covered range (cov is updated too)
+        rows = []
+        for addr, logs in by_addr.items():
+            for L in logs:
+                topics = L.get("topics") or []
+                if len(topics) < 3:
+                    continue
+                data = L.get("data") or "0x0"
+                rows.append((
+                    chain, addr, int(L["blockNumber"], 16), int(L["logIndex"], 16), L.get("transactionHash"),
+                    "0x" + topics[1][-40:], "0x" + topics[2][-40:], str(int(data, 16)), data, L.get("address") or "",
+                ))
+        for addr in by_addr:
+            c = cov.get(addr)
+            cov[addr] = (start, end) if c is None else (min(start, c[0]), max(end, c[1]))
+        with self._lock, self._db:
+            self._db.executemany(
+                "DELETE FROM transfers WHERE chain = ? AND address = ? AND block >= ? AND block <= ?",
+                [(chain, addr, start, end) for addr in by_addr],
+            )
+            self._db.executemany("INSERT OR REPLACE INTO transfers VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", rows)
+            self._db.executemany(
+                "INSERT INTO cursors (chain, address, synced_block, low_block, last_queried) VALUES (?, ?, ?, ?, ?) "
+                "ON CONFLICT (chain, address) DO UPDATE SET synced_block = excluded.synced_block, low_block = excluded.low_block",
+                [(chain, addr, cov[addr][1], cov[addr][0], time.time()) for addr in by_addr],
+            )
+
+    def query(self, chain: str, address: str, from_block: int, to_block: int, limit: int) -> List[Dict[str, Any]]:
+        # newest `limit` transfers in range, returned in chain order and in eth_getLogs shape
+        with self._lock, self._db:
+            self._db.execute(
+                "UPDATE cursors SET last_queried = ? WHERE chain = ? AND address = ?", (time.time(), chain, address.lower())
+            )
+            rows = self._db.execute(
+                "SELECT block, log_index, tx_hash, from_addr, to_addr, data, contract FROM transfers "
+                "WHERE chain = ? AND address = ? AND block >= ? AND block <= ? "
+                "ORDER BY block DESC, log_index DESC LIMIT ?",
+                (chain, address.lower(), from_block, to_block, limit),
+            ).fetchall()
+        topic0 = USDT[chain]["topic_transfer"]
+        return [
+            {
+                "blockNumber": hex(block),
+                "transactionHash": tx_hash,
+                "logIndex": hex(log_index),
+                "data": data,
+                "topics": [topic0, evm_topic_address(from_addr), evm_topic_address(to_addr)],
+                "address": contract,
+            }
+            for block, log_index, tx_hash, from_addr, to_addr, data, contract in reversed(rows)
+        ]
+
+_log_index: Optional[UsdtLogIndex] = None
+_log_index_lock = threading.Lock()
+
+def get_log_index() -> Optional[UsdtLogIndex]:
+    global _log_index
+    if LOG_INDEX_PATH is None:
+        return None
+    with _log_index_lock:
+        if _log_index is None:
+            _log_index = UsdtLogIndex(LOG_INDEX_PATH)
+        return _log_index
+
+# =========================
+# TX CACHE
+# =========================
+class TxCache:
+    # Immutable transaction payloads only (finalized/confirmed): entries are never invalidated,
+    # just evicted least-recently-used once TX_CACHE_MAX_ITEMS or the byte budget is exceeded.
+    # Sizes are the JSON-encoded length of the payload.
+    def __init__(self, max_items: int, max_bytes: int, disk_path: Optional[str] = None, disk_max_bytes: int = 0):
+        self.max_items = max_items
+        self.max_bytes = max_bytes
+        self._mem: "OrderedDict[str, Tuple[Any, int]]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._counters = {"hits": 0, "disk_hits": 0, "misses": 0, "puts": 0, "evictions": 0}
+        self._disk: Optional[sqlite3.Connection] = None
+        self._disk_lock = threading.Lock()
+        self._disk_max_bytes = disk_max_bytes
+        self._disk_bytes = 0
+        if disk_path:
+            self._disk = sqlite3.connect(disk_path, check_same_thread=False)
+            with self._disk_lock:
+                self._disk.executescript("""
+                    PRAGMA journal_mode=WAL;
+                    CREATE TABLE IF NOT EXISTS txs (
+                        key TEXT PRIMARY KEY,
+                        value TEXT NOT NULL,
+                        size INTEGER NOT NULL,
+                        stored_at REAL NOT NULL
+                    );
+                    CREATE INDEX IF NOT EXISTS txs_stored_at ON txs (stored_at);
+                """)
+                self._disk_bytes = self._disk.execute("SELECT COALESCE(SUM(size), 0) FROM txs").fetchone()[0]
+
+    def get(self, key: str) -> Optional[Any]:
+        with self._lock:
+            hit = self._mem.get(key)
+            if hit is not None:
+                self._mem.move_to_end(key)
+                self._counters["hits"] += 1
+                return hit[0]
+        if self._disk is not None:
+            with self._disk_lock:
+                row = self._disk.execute("SELECT value FROM txs WHERE key = ?", (key,)).fetchone()
+            if row is not None:
+                value = json.loads(row[0])
+                self._put_mem(key, value, len(row[0]))
+                with self._lock:
+                    self._counters["disk_hits"] += 1
+                return value
+        with self._lock:
+            self._counters["misses"] += 1
+        return None
+
+    def put(self, key: str, value: Any) -> None:
+        raw = json.dumps(value, separators=(",", ":"))
+        self._put_mem(key, value, len(raw))
+        if self._disk is not None:
+            self._put_disk(key, raw)
+        with self._lock:
+            self._counters["puts"] += 1
+
+    def _put_mem(self, key: str, value: Any, size: int) -> None:
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            old = self._mem.pop(key, None)
+            if old is not None:
+                self._bytes -= old[1]
+            self._mem[key] = (value, size)
+            self._bytes += size
+            while len(self._mem) > self.max_items or self._bytes > self.max_bytes:
+                _, (_, sz) = self._mem.popitem(last=False)
+                self._bytes -= sz
+                self._counters["evictions"] += 1
+
+    def _put_disk(self, key: str, raw: str) -> None:
+        with self._disk_lock, self._disk:
+            old = self._disk.execute("SELECT size FROM txs WHERE key = ?", (key,)).fetchone()
+            self._disk.execute("INSERT OR REPLACE INTO txs VALUES (?, ?, ?, ?)", (key, raw, len(raw), time.time()))
+            self._disk_bytes += len(raw) - (old[0] if old else 0)
+            if self._disk_bytes > self._disk_max_bytes:
+                # drop the oldest ~10% of the budget in one pass
+                target = int(self._disk_max_bytes * 0.9)
+                freed = 0
+                doomed = []
+                for k, sz in self._disk.execute("SELECT key, size FROM txs ORDER BY stored_at"):
+                    if self._disk_bytes - freed <= target:
+                        break
+                    doomed.append((k,))
+                    freed += sz
+                self._disk.executemany("DELETE FROM txs WHERE key = ?", doomed)
+                self._disk_bytes -= freed
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            out: Dict[str, Any] = dict(self._counters, items=len(self._mem), bytes=self._bytes, max_bytes=self.max_bytes)
+        lookups = out["hits"] + out["disk_hits"] + out["misses"]
+        out["hit_ratio"] = round((out["hits"] + out["disk_hits"]) / lookups, 4) if lookups else 0.0
+        if self._disk is not None:
+            out["disk_bytes"] = self._disk_bytes
+        return out
+
+tx_cache = TxCache(TX_CACHE_MAX_ITEMS, TX_CACHE_MAX_BYTES, TX_CACHE_DISK_PATH, TX_CACHE_DISK_MAX_BYTES)
+
+# =========================
+# ATA CACHE (Solana)
+# =========================
+class AtaCache:
+    # owner -> token account for a mint. Entries are the locally derived associated token account
+    # unless an RPC lookup found the owner's tokens elsewhere; ATAs never move, so nothing expires.
+    def __init__(self, max_items: int, path: Optional[str] = None):
+        self.max_items = max_items
+        self._mem: "OrderedDict[Tuple[str, str], str]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._counters = {"hits": 0, "disk_hits": 0, "derived": 0, "puts": 0}
+        self._db: Optional[sqlite3.Connection] = None
+        self._db_lock = threading.Lock()
+        if path:
+            self._db = sqlite3.connect(path, check_same_thread=False)
+            with self._db_lock:
+                self._db.executescript("""
+                    PRAGMA journal_mode=WAL;
+                    CREATE TABLE IF NOT EXISTS token_accounts (
+                        owner TEXT NOT NULL,
+                        mint TEXT NOT NULL,
+                        account TEXT NOT NULL,
+                        PRIMARY KEY (owner, mint)
+                    );
+                """)
+
+    def _remember(self, key: Tuple[str, str], account: str) -> None:
+        with self._lock:
+            self._mem[key] = account
+            self._mem.move_to_end(key)
+            while len(self._mem) > self.max_items:
+                self._mem.popitem(last=False)
+
+    def get(self, owner: str, mint: str) -> Optional[str]:
+        key = (owner, mint)
+        with self._lock:
+            hit = self._mem.get(key)
+            if hit is not None:
+                self._mem.move_to_end(key)
+                self._counters["hits"] += 1
+                return hit
+        if self._db is None:
+            return None
+        with self._db_lock:
+            row = self._db.execute("SELECT account FROM token_accounts WHERE owner = ? AND mint = ?", key).fetchone()
+        if row is None:
+            return None
+        self._remember(key, row[0])
+        with self._lock:
+            self._counters["disk_hits"] += 1
+        return row[0]
+
+    def put(self, owner: str, mint: str, account: str) -> None:
+        self._remember((owner, mint), account)
+        if self._db is not None:
+            with self._db_lock, self._db:
+                self._db.execute("INSERT OR REPLACE INTO token_accounts VALUES (?, ?, ?)", (owner, mint, account))
+        with self._lock:
+            self._counters["puts"] += 1
+
+    def resolve(self, owner: str, mint: str) -> str:
+        # raises ValueError for owners that are not 32-byte public keys
+        account = self.get(owner, mint)
+        if account is None:
+            account = sol_derive_ata(owner, mint)
+            with self._lock:
+                self._counters["derived"] += 1
+            self.put(owner, mint, account)
+        return account
+
+    def resolve_many(self, owners: List[str], mint: str) -> List[str]:
+        return [self.resolve(o, mint) for o in owners]
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return dict(self._counters, items=len(self._mem))
+
+_ata_cache: Optional[AtaCache] = None
+_ata_cache_lock = threading.Lock()
+
+def get_ata_cache() -> AtaCache:
+    # created on first use, so importing the module does not create SOL_ATA_CACHE_PATH
+    global _ata_cache
+    with _ata_cache_lock:
+        if _ata_cache is None:
+            _ata_cache = AtaCache(SOL_ATA_CACHE_MAX_ITEMS, SOL_ATA_CACHE_PATH)
+        return _ata_cache
 
 # =========================
 # HISTORIES
 # =========================
-def _evm_history_usdt(url_rpc: str, chain_key: Literal["eth", "bsc"], address: str, from_block: str, to_block: str, limit_logs: int) -> Dict[str, Any]:
+def _history_error(address: str, e: Exception) -> Dict[str, Any]:
+    return {"status": "error", "address": address, "error_detail": f"Unexpected error: {error_text(e)}", "timestamp": utc_now()}
+
+def _ndjson_line(rec: Dict[str, Any]) -> bytes:
+    return json_bytes(rec) + b"\n"
+
+def _history_stream(results: Iterator[Tuple[int, Dict[str, Any]]]) -> StreamingResponse:
+    def gen() -> Iterator[bytes]:
+        count = 0
+        errors = []
+        for i, res in results:
+            count += 1
+            if res.get("status") == "error":
+                errors.append({"index": i, "address": res.get("address"), "error_detail": res.get("error_detail")})
+            yield _ndjson_line({"type": "result", "index": i, **res})
+        yield _ndjson_line({"type": "trailer", "status": "ok", "count": count, "errors": errors, "timestamp": utc_now()})
+
+    return StreamingResponse(gen(), media_type="application/x-ndjson")
+
+def _history_batch(addresses: List[str], fn: Callable[[str], Dict[str, Any]], provider: str, stream: bool):
+    observe_batch(len(addresses))
+    if not stream:
+        res = fan_out(addresses, fn, provider, _history_error)
+        return FastJSONResponse({"status": "ok", "count": len(res), "results": res, "timestamp": utc_now()})
+    return _history_stream(fan_out_iter(addresses, fn, provider, _history_error))
+
+def _history_batch_shared(
+    addresses: List[str],
+    fn: Callable[[List[str]], Iterator[Tuple[int, Dict[str, Any]]]],
+    helper: str,
+    stream: bool,
+):
+    # one shared call answers the whole batch, yielding (index, record) as each address completes
+    observe_batch(len(addresses))
+
+    def results() -> Iterator[Tuple[int, Dict[str, Any]]]:
+        done = set()
+        t0 = time.perf_counter()
+        try:
+            for i, res in fn(addresses):
+                done.add(i)
+                m_helper_results.inc(helper, _result_status(res))
+                yield i, res
+        except Exception as e:
+            m_helper_results.inc(helper, "exception")
+            for i, a in enumerate(addresses):
+                if i not in done:
+                    yield i, _history_error(a, e)
+        finally:
+            m_helper_seconds.observe(time.perf_counter() - t0, helper)
+
+    if not stream:
+        res: List[Any] = [None] * len(addresses)
+        for i, rec in results():
+            res[i] = rec
+        return FastJSONResponse({"status": "ok", "count": len(res), "results": res, "timestamp": utc_now()})
+    return _history_stream(results())
+
+def _evm_log_columns(logs: List[Dict[str, Any]]) -> Dict[str, List[Any]]:
+    return {
+        "blockNumber": [L.get("blockNumber") for L in logs],
+        "txHash": [L.get("transactionHash") for L in logs],
+        "logIndex": [L.get("logIndex") for L in logs],
+        "data": [L.get("data") for L in logs],
+        "topics": [L.get("topics") for L in logs],
+        "address": [L.get("address") for L in logs],
+    }
+
+def decode_usdt_transfers(chain_key: Literal["eth", "bsc"], address: str, logs: List[Dict[str, Any]]) -> Dict[str, List[Any]]:
+    # Decodes Transfer(from, to, value) logs column by column; amount is scaled by the token decimals
+    # and direction is relative to `address` ("in", "out" or "self").
+    logs = [L for L in logs if len(L.get("topics") or []) >= 3]
+    decimals = USDT[chain_key]["decimals"]
+    me = address.lower()
+    topics = [L["topics"] for L in logs]
+    frm = ["0x" + t[1][-40:].lower() for t in topics]
+    to = ["0x" + t[2][-40:].lower() for t in topics]
+    return {
+        "blockNumber": [int(L["blockNumber"], 16) for L in logs],
+        "txHash": [L.get("transactionHash") for L in logs],
+        "logIndex": [int(L["logIndex"], 16) for L in logs],
+        "from": frm,
+        "to": to,
+        "amount": [format_units(int(L.get("data") or "0x0", 16), decimals) for L in logs],
+        "direction": ["self" if f == t else ("out" if f == me else "in") for f, t in zip(frm, to)],
+    }
+
+def columns_to_rows(cols: Dict[str, List[Any]]) -> List[Dict[str, Any]]:
+    keys = list(cols)
+    return [dict(zip(keys, vals)) for vals in zip(*cols.values())]
+
+@instrumented("history_evm_usdt")
+def _evm_history_usdt(
+    url_rpc: str,
+    chain_key: Literal["eth", "bsc"],
+    address: str,
+    from_block: str,
+    to_block: str,
+    limit_logs: int,
+    output: Literal["raw", "decoded"] = "raw",
+    layout: Literal["rows", "columns"] = "rows",
+) -> Dict[str, Any]:
     if not is_evm_address(address):
         return {"status": "error", "address": address, "error_detail": f"Invalid {chain_key.upper()} address", "timestamp": utc_now()}
     try:
-        logs = evm_get_logs(
-            url_rpc,
-            USDT[chain_key]["contract"],
-            USDT[chain_key]["topic_transfer"],
-            from_block,
-            to_block,
-        )
-        if len(logs) > limit_logs:
-            logs = logs[-limit_logs:]
-        out = []
-        for L in logs:
-            out.append({
-                "blockNumber": L.get("blockNumber"),
-                "txHash": L.get("transactionHash"),
-                "logIndex": L.get("logIndex"),
-                "data": L.get("data"),
-                "topics": L.get("topics"),
-                "address": L.get("address"),
-            })
-        return {"status": "ok", "address": address, "count": len(out), "results": out, "timestamp": utc_now()}
+        lo = evm_resolve_block(url_rpc, from_block or "0x0")
+        hi = evm_resolve_block(url_rpc, to_block)
+    except ValueError:
+        return {"status": "error", "address": address, "error_detail": f"Invalid block range: {from_block}..{to_block}", "timestamp": utc_now()}
     except requests.RequestException as e:
         return {"status": "error", "address": address, "error_detail": f"{chain_key.upper()} RPC error: {e}", "timestamp": utc_now()}
+    try:
+        index = get_log_index()
+        if index is not None:
+            logs = []
+            for a in index.iter_sync(url_rpc, chain_key, [address], lo, hi, limit_logs):
+                logs = index.query(chain_key, a, lo, hi, limit_logs)
+        else:
+            logs = evm_scan_usdt_transfers(url_rpc, chain_key, address, lo, hi, limit_logs)
+        return _evm_history_result(chain_key, address, logs, limit_logs, output, layout)
+    except (requests.RequestException, RpcError) as e:
+        return {"status": "error", "address": address, "error_detail": f"{chain_key.upper()} RPC error: {e}", "timestamp": utc_now()}
+
+def _evm_history_result(
+    chain_key: Literal["eth", "bsc"],
+    address: str,
+    logs: List[Dict[str, Any]],
+    limit_logs: int,
+    output: Literal["raw", "decoded"],
+    layout: Literal["rows", "columns"],
+) -> Dict[str, Any]:
+    if len(logs) > limit_logs:
+        logs = logs[-limit_logs:]
+    cols = decode_usdt_transfers(chain_key, address, logs) if output == "decoded" else _evm_log_columns(logs)
+    count = len(cols["txHash"])
+    out = cols if layout == "columns" else columns_to_rows(cols)
+    return {"status": "ok", "address": address, "count": count, "results": out, "timestamp": utc_now()}
+
+def _evm_history_usdt_iter(
+    url_rpc: str,
+    chain_key: Literal["eth", "bsc"],
+    addresses: List[str],
+    from_block: str,
+    to_block: str,
+    limit_logs: int,
+    output: Literal["raw", "decoded"] = "raw",
+    layout: Literal["rows", "columns"] = "rows",
+) -> Iterator[Tuple[int, Dict[str, Any]]]:
+    # Batch form of _evm_history_usdt: the block range is resolved once and all valid addresses
+    # share one OR-list scan (or one index sync). Yields (index, record) per address as soon as
+    # its logs are split out of the scan.
+    def error(address: str, detail: str) -> Dict[str, Any]:
+        return {"status": "error", "address": address, "error_detail": detail, "timestamp": utc_now()}
+
+    positions: Dict[str, List[int]] = {}
+    for i, a in enumerate(addresses):
+        if is_evm_address(a):
+            positions.setdefault(a.lower(), []).append(i)
+        else:
+            yield i, error(a, f"Invalid {chain_key.upper()} address")
+    if not positions:
+        return
+
+    def fail(detail: str) -> Iterator[Tuple[int, Dict[str, Any]]]:
+        for a in list(positions):
+            for i in positions.pop(a):
+                yield i, error(addresses[i], detail)
+
+    def records(a: str, logs: List[Dict[str, Any]]) -> Iterator[Tuple[int, Dict[str, Any]]]:
+        for i in positions.pop(a):
+            yield i, _evm_history_result(chain_key, addresses[i], logs, limit_logs, output, layout)
+
+    try:
+        lo = evm_resolve_block(url_rpc, from_block or "0x0")
+        hi = evm_resolve_block(url_rpc, to_block)
+    except ValueError:
+        yield from fail(f"Invalid block range: {from_block}..{to_block}")
+        return
+    except requests.RequestException as e:
+        yield from fail(f"{chain_key.upper()} RPC error: {e}")
+        return
+    try:
+        index = get_log_index()
+        if index is not None:
+            for a in index.iter_sync(url_rpc, chain_key, list(positions), lo, hi, limit_logs):
+                yield from records(a, index.query(chain_key, a, lo, hi, limit_logs))
+        else:
+            for a, logs in evm_iter_usdt_transfers(url_rpc, chain_key, list(positions), lo, hi, limit_logs):
+                yield from records(a, logs)
+    except (requests.RequestException, RpcError) as e:
+        yield from fail(f"{chain_key.upper()} RPC error: {e}")
 
 @app.post("/eth/history_usdt")
 def eth_history_usdt(body: EthHistoryBody):
-    return _evm_history_usdt(ETH_RPC, "eth", body.address, body.from_block, body.to_block, body.limit_logs)
+    return FastJSONResponse(_evm_history_usdt(ETH_RPC, "eth", body.address, body.from_block, body.to_block, body.limit_logs, body.output, body.layout))
 
 @app.post("/bsc/history_usdt")
 def bsc_history_usdt(body: EthHistoryBody):
-    return _evm_history_usdt(BSC_RPC, "bsc", body.address, body.from_block, body.to_block, body.limit_logs)
+    return FastJSONResponse(_evm_history_usdt(BSC_RPC, "bsc", body.address, body.from_block, body.to_block, body.limit_logs, body.output, body.layout))
 
 @app.post("/eth/history_usdt_batch")
 def eth_history_usdt_batch(body: EthHistoryBatchBody):
-    res = []
-    for a in body.addresses:
-        res.append(_evm_history_usdt(ETH_RPC, "eth", a, body.from_block, body.to_block, body.limit_logs))
-    return {"status": "ok", "count": len(res), "results": res, "timestamp": utc_now()}
+    fn = lambda addrs: _evm_history_usdt_iter(ETH_RPC, "eth", addrs, body.from_block, body.to_block, body.limit_logs, body.output, body.layout)
+    return _history_batch_shared(body.addresses, fn, "history_evm_usdt_batch", body.stream)
 
 @app.post("/bsc/history_usdt_batch")
 def bsc_history_usdt_batch(body: EthHistoryBatchBody):
-    res = []
-    for a in body.addresses:
-        res.append(_evm_history_usdt(BSC_RPC, "bsc", a, body.from_block, body.to_block, body.limit_logs))
-    return {"status": "ok", "count": len(res), "results": res, "timestamp": utc_now()}
+    fn = lambda addrs: _evm_history_usdt_iter(BSC_RPC, "bsc", addrs, body.from_block, body.to_block, body.limit_logs, body.output, body.layout)
+    return _history_batch_shared(body.addresses, fn, "history_evm_usdt_batch", body.stream)
+@instrumented("history_tron")
 def _tron_history_one(address: str, page_size: int, next_page: Optional[str]) -> Dict[str, Any]:
     if not is_tron_address(address):
         return {"status": "error", "address": address, "error_detail": "Invalid TRON address", "timestamp": utc_now()}
-    url = f"https://api.tatum.io/v3/tron/transaction/account/{address}"
+    url = f"{TATUM_API}/v3/tron/transaction/account/{address}"
     params = {"pageSize": page_size}
     if next_page:
         params["next"] = next_page
@@ -417,10 +2457,11 @@ def _tron_history_one(address: str, page_size: int, next_page: Optional[str]) ->
     except requests.RequestException as e:
         return {"status": "error", "address": address, "error_detail": f"TRON API error: {e}", "timestamp": utc_now()}
 
+@instrumented("history_tron_usdt")
 def _tron_history_usdt_one(address: str, page_size: int, next_page: Optional[str]) -> Dict[str, Any]:
     if not is_tron_address(address):
         return {"status": "error", "address": address, "error_detail": "Invalid TRON address", "timestamp": utc_now()}
-    url = f"https://api.tatum.io/v3/tron/transaction/account/{address}/trc20"
+    url = f"{TATUM_API}/v3/tron/transaction/account/{address}/trc20"
     params = {"pageSize": page_size}
     if next_page:
         params["next"] = next_page
@@ -435,29 +2476,28 @@ def _tron_history_usdt_one(address: str, page_size: int, next_page: Optional[str
 
 @app.post("/tron/history")
 def tron_history(body: TronHistoryBatchBody):
-    return _tron_history_one(body.addresses[0], body.page_size, body.next_page)
+    return FastJSONResponse(_tron_history_one(body.addresses[0], body.page_size, body.next_page))
 
 @app.post("/tron/history_usdt")
 def tron_history_usdt(body: TronHistoryBatchBody):
-    return _tron_history_usdt_one(body.addresses[0], body.page_size, body.next_page)
+    return FastJSONResponse(_tron_history_usdt_one(body.addresses[0], body.page_size, body.next_page))
 
 @app.post("/tron/history_batch")
 def tron_history_batch(body: TronHistoryBatchBody):
-    out = []
-    for a in body.addresses:
-        out.append(_tron_history_one(a, body.page_size, body.next_page))
-    return {"status": "ok", "count": len(out), "results": out, "timestamp": utc_now()}
+    cursors = body.cursors or {}
+    fn = lambda a: _tron_history_one(a, body.page_size, cursors.get(a, body.next_page))
+    return _history_batch(body.addresses, fn, "tatum", body.stream)
 
 @app.post("/tron/history_usdt_batch")
 def tron_history_usdt_batch(body: TronHistoryBatchBody):
-    out = []
-    for a in body.addresses:
-        out.append(_tron_history_usdt_one(a, body.page_size, body.next_page))
-    return {"status": "ok", "count": len(out), "results": out, "timestamp": utc_now()}
+    cursors = body.cursors or {}
+    fn = lambda a: _tron_history_usdt_one(a, body.page_size, cursors.get(a, body.next_page))
+    return _history_batch(body.addresses, fn, "tatum", body.stream)
+@instrumented("history_btc")
 def _btc_history_one(address: str, page_size: int, offset: int) -> Dict[str, Any]:
     if not is_btc_address(address):
         return {"status": "error", "address": address, "error_detail": "Invalid BTC address", "timestamp": utc_now()}
-    url = f"https://api.tatum.io/v3/bitcoin/transaction/address/{address}"
+    url = f"{TATUM_API}/v3/bitcoin/transaction/address/{address}"
     params = {"pageSize": page_size, "offset": offset}
     try:
         r = request_with_retry("GET", url, HEADERS_JSON, params=params, timeout=20)
@@ -469,74 +2509,610 @@ def _btc_history_one(address: str, page_size: int, offset: int) -> Dict[str, Any
 
 @app.post("/btc/history")
 def btc_history(body: BtcHistoryBatchBody):
-    return _btc_history_one(body.addresses[0], body.page_size, body.offset)
+    return FastJSONResponse(_btc_history_one(body.addresses[0], body.page_size, body.offset))
 
 @app.post("/btc/history_batch")
 def btc_history_batch(body: BtcHistoryBatchBody):
-    out = []
-    for a in body.addresses:
-        out.append(_btc_history_one(a, body.page_size, body.offset))
-    return {"status": "ok", "count": len(out), "results": out, "timestamp": utc_now()}
+    fn = lambda a: _btc_history_one(a, body.page_size, body.offset)
+    return _history_batch(body.addresses, fn, "tatum", body.stream)
     
-@app.post("/solana/history_batch")
-def solana_history_batch(body: SolanaHistoryBatchBody):
-    results = []
-    for addr in body.addresses:
-        if not is_solana_address(addr):
-            results.append({"status": "error", "address": addr, "error_detail": "Invalid Solana address", "timestamp": utc_now()})
-            continue
-        query_address = addr
-        if body.only_usdt:
-            ata = sol_find_ata(addr, USDT["sol"]["mint"])
-            if ata:
-                query_address = ata
+def _sol_has_token_transfer(tx: Dict[str, Any]) -> bool:
+    instr = (((tx.get("transaction") or {}).get("message") or {}).get("instructions") or [])
+    for i in instr:
+        if isinstance(i, dict):
+            pid = i.get("programId") or i.get("programIdIndex")
+            if i.get("program") == "spl-token" or pid == SPL_TOKEN_PROGRAM:
+                return True
+    return False
 
-        try:
-            sigs = sol_get_signatures_for_address(query_address, limit=body.limit, before=body.before)
-            out_txs = []
-            for s in sigs:
-                sig = s.get("signature")
-                if not sig:
+@instrumented("history_sol")
+def _solana_history_one(addr: str, limit: int, before: Optional[str], only_token_transfers: bool, only_usdt: bool) -> Dict[str, Any]:
+    if not is_solana_address(addr):
+        return {"status": "error", "address": addr, "error_detail": "Invalid Solana address", "timestamp": utc_now()}
+    query_address = addr
+    mint = USDT["sol"]["mint"]
+    try:
+        if only_usdt:
+            query_address = sol_find_ata(addr, mint) or addr
+
+        raw_sigs = sol_get_signatures_for_address(query_address, limit=limit, before=before)
+        if only_usdt and not raw_sigs and before is None:
+            # no activity on the derived account: the owner may hold USDT in another token account
+            accs = sol_get_token_accounts_by_owner(addr, mint)
+            if accs and accs[0] != query_address:
+                get_ata_cache().put(addr, mint, accs[0])
+                query_address = accs[0]
+                raw_sigs = sol_get_signatures_for_address(query_address, limit=limit, before=before)
+        sigs = [s for s in raw_sigs if s.get("signature")]
+        cached = {s["signature"]: tx_cache.get("sol:" + s["signature"]) for s in sigs}
+        out_txs = []
+        # getTransaction calls go out in JSON-RPC batches for cache misses; each batch is filtered as soon as it lands
+        for start in range(0, len(sigs), SOL_RPC_MAX_BATCH):
+            chunk = sigs[start:start + SOL_RPC_MAX_BATCH]
+            need = [s["signature"] for s in chunk if cached[s["signature"]] is None]
+            if need:
+                for sig, tx in zip(need, sol_get_transactions(need)):
+                    if isinstance(tx, Exception):
+                        raise tx
+                    if tx:
+                        # getTransaction is queried at finalized commitment, so the payload is final
+                        tx_cache.put("sol:" + sig, tx)
+                    cached[sig] = tx
+            for s in chunk:
+                tx = cached[s["signature"]]
+                if only_token_transfers and not _sol_has_token_transfer(tx):
                     continue
-                tx = sol_get_transaction(sig) or {}
-                if body.only_token_transfers:
-                    instr = (((tx.get("transaction") or {}).get("message") or {}).get("instructions") or [])
-                    has_spl = False
-                    for i in instr:
-                        if isinstance(i, dict):
-                            pid = i.get("programId") or i.get("programIdIndex")
-                            if i.get("program") == "spl-token" or pid == SPL_TOKEN_PROGRAM:
-                                has_spl = True
-                                break
-                    if not has_spl:
-                        continue
                 out_txs.append({
-                    "signature": sig,
+                    "signature": s["signature"],
                     "slot": s.get("slot"),
                     "blockTime": s.get("blockTime"),
                     "tx": tx,
                 })
 
-            results.append({
-                "status": "ok",
-                "address": addr,
-                "count": len(out_txs),
-                "results": out_txs,
-                "timestamp": utc_now(),
-                "query_address": query_address,
-                "before": body.before,
-            })
+        return {
+            "status": "ok",
+            "address": addr,
+            "count": len(out_txs),
+            "results": out_txs,
+            "timestamp": utc_now(),
+            "query_address": query_address,
+            "before": before,
+            # `before` for the next page; null once the signature list is exhausted
+            "next_before": sigs[-1]["signature"] if sigs and len(raw_sigs) >= limit else None,
+        }
+    except (requests.RequestException, RpcError) as e:
+        return {"status": "error", "address": addr, "error_detail": f"SOL RPC error: {e}", "timestamp": utc_now()}
+
+@app.post("/solana/history_batch")
+def solana_history_batch(body: SolanaHistoryBatchBody):
+    fn = lambda a: _solana_history_one(a, body.limit, body.before, body.only_token_transfers, body.only_usdt)
+    return _history_batch(body.addresses, fn, "sol_rpc", body.stream)
+
+# =========================
+# HISTORY EXPORT
+# =========================
+# A page fetcher maps (address, upstream cursor) to (status dict, next upstream cursor or None).
+# Resume cursors are opaque to clients: base64url JSON of the upstream cursor plus how many items
+# of that page were already emitted, so an export cut off mid-page resumes at the exact item.
+PageFetcher = Callable[[str, Any], Tuple[Dict[str, Any], Any]]
+
+def encode_cursor(kind: str, address: str, page: Any, skip: int) -> str:
+    raw = json_bytes({"k": kind, "a": address, "p": page, "s": skip})
+    return base64.urlsafe_b64encode(raw).rstrip(b"=").decode()
+
+def decode_cursor(token: str, kind: str, address: str) -> Tuple[Any, int]:
+    try:
+        c = json.loads(base64.urlsafe_b64decode(token + "=" * (-len(token) % 4)))
+        if c["k"] != kind or c["a"] != address:
+            raise ValueError("cursor belongs to a different export")
+        return c["p"], int(c["s"])
+    except (ValueError, KeyError, TypeError):
+        raise ValueError(f"Invalid cursor for {address}")
+
+def _tron_page(page_size: int, usdt: bool) -> PageFetcher:
+    one = _tron_history_usdt_one if usdt else _tron_history_one
+    def fetch(address: str, page: Any) -> Tuple[Dict[str, Any], Any]:
+        res = one(address, page_size, page)
+        return res, res.get("next")
+    return fetch
+
+def _btc_page(page_size: int) -> PageFetcher:
+    def fetch(address: str, page: Any) -> Tuple[Dict[str, Any], Any]:
+        offset = page or 0
+        res = _btc_history_one(address, page_size, offset)
+        n = len(res.get("results") or [])
+        return res, offset + n if n >= page_size else None
+    return fetch
+
+def _solana_page(page_size: int, only_token_transfers: bool, only_usdt: bool) -> PageFetcher:
+    def fetch(address: str, page: Any) -> Tuple[Dict[str, Any], Any]:
+        res = _solana_history_one(address, page_size, page, only_token_transfers, only_usdt)
+        return res, res.get("next_before")
+    return fetch
+
+def _item_position(kind: str, item: Dict[str, Any]) -> Tuple[Optional[int], Optional[float]]:
+    # (block or slot, unix seconds) of a history item, None where the upstream omits it
+    if kind == "sol":
+        return item.get("slot"), item.get("blockTime")
+    if kind == "btc":
+        return item.get("blockNumber"), item.get("time")
+    ts = item.get("timestamp") if kind == "tron_usdt" else (item.get("rawData") or {}).get("timestamp")
+    return item.get("blockNumber"), ts / 1000 if isinstance(ts, (int, float)) else None
+
+def _before_bound(kind: str, item: Dict[str, Any], since_time: Optional[int], since_block: Optional[int]) -> bool:
+    block, ts = _item_position(kind, item)
+    if since_block is not None and isinstance(block, int) and block < since_block:
+        return True
+    return since_time is not None and ts is not None and ts < since_time
+
+def iter_history(
+    kind: str,
+    address: str,
+    fetch: PageFetcher,
+    cursor: Optional[str],
+    since_time: Optional[int],
+    since_block: Optional[int],
+    max_items: int,
+) -> Iterator[Dict[str, Any]]:
+    # Walks one address newest-first, yielding {"type": "item"} records and a final {"type": "end"}.
+    # The next page is requested as soon as the current one arrives, so it downloads while the
+    # current page is being emitted.
+    try:
+        page, skip = decode_cursor(cursor, kind, address) if cursor else (None, 0)
+    except ValueError as e:
+        yield {"type": "end", "status": "error", "address": address, "count": 0, "stopped": "error", "cursor": cursor, "error_detail": str(e)}
+        return
+    count = 0
+    pending = submit_ctx(_batch_pool, fetch, address, page)
+    try:
+        while True:
+            try:
+                res, next_page = pending.result()
+            except Exception as e:
+                res, next_page = _history_error(address, e), None
+            if res.get("status") != "ok":
+                pending = None
+                yield {"type": "end", "status": "error", "address": address, "count": count, "stopped": "error",
+                       "cursor": encode_cursor(kind, address, page, skip), "error_detail": res.get("error_detail")}
+                return
+            items = res.get("results") or []
+            pending = submit_ctx(_batch_pool, fetch, address, next_page) if next_page is not None else None
+            for j in range(skip, len(items)):
+                if count >= max_items:
+                    yield {"type": "end", "status": "ok", "address": address, "count": count, "stopped": "max_items",
+                           "cursor": encode_cursor(kind, address, page, j)}
+                    return
+                if _before_bound(kind, items[j], since_time, since_block):
+                    yield {"type": "end", "status": "ok", "address": address, "count": count, "stopped": "bound", "cursor": None}
+                    return
+                count += 1
+                yield {"type": "item", "address": address, "item": items[j]}
+            if pending is None:
+                yield {"type": "end", "status": "ok", "address": address, "count": count, "stopped": "exhausted", "cursor": None}
+                return
+            page, skip = next_page, 0
+    finally:
+        if pending is not None:
+            pending.cancel()
+
+def _history_export(kind: str, body: HistoryExportBody, fetch: PageFetcher) -> StreamingResponse:
+    observe_batch(len(body.addresses))
+    cursors = body.cursors or {}
+
+    def gen() -> Iterator[bytes]:
+        count = 0
+        resume: Dict[str, Optional[str]] = {}
+        errors = []
+        for a in dict.fromkeys(body.addresses):
+            for rec in iter_history(kind, a, fetch, cursors.get(a), body.since_time, body.since_block, body.max_items):
+                if rec["type"] == "end":
+                    resume[a] = rec["cursor"]
+                    if rec["status"] == "error":
+                        errors.append({"address": a, "error_detail": rec.get("error_detail")})
+                else:
+                    count += 1
+                yield _ndjson_line(rec)
+        yield _ndjson_line({"type": "trailer", "status": "ok", "count": count, "cursors": resume, "errors": errors, "timestamp": utc_now()})
+
+    return StreamingResponse(gen(), media_type="application/x-ndjson")
+
+@app.post("/tron/history_export")
+def tron_history_export(body: HistoryExportBody):
+    return _history_export("tron", body, _tron_page(body.page_size, False))
+
+@app.post("/tron/history_usdt_export")
+def tron_history_usdt_export(body: HistoryExportBody):
+    return _history_export("tron_usdt", body, _tron_page(body.page_size, True))
+
+@app.post("/btc/history_export")
+def btc_history_export(body: HistoryExportBody):
+    return _history_export("btc", body, _btc_page(body.page_size))
+
+@app.post("/solana/history_export")
+def solana_history_export(body: SolanaHistoryExportBody):
+    return _history_export("sol", body, _solana_page(body.page_size, body.only_token_transfers, body.only_usdt))
+
+# =========================
+# WATCH LIST / WEBHOOKS
+# =========================
+class WatchStore:
+    # Subscriptions (a webhook URL + watched addresses on one chain), a last-processed block per
+    # watched address, and an outbox of events per subscription. A subscription only receives
+    # events above its own start_block, and outbox rows are unique per (subscription, event),
+    # so a cursor moved back for a backfill never re-delivers to existing subscriptions.
+    # Outbox rows are leased while a delivery is in flight, so several workers can share the file.
+    def __init__(self, path: str):
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._lock = threading.Lock()
+        with self._lock:
+            self._db.executescript("""
+                PRAGMA journal_mode=WAL;
+                CREATE TABLE IF NOT EXISTS subscriptions (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    chain TEXT NOT NULL,
+                    url TEXT NOT NULL,
+                    secret TEXT,
+                    created_at TEXT NOT NULL
+                );
+                CREATE TABLE IF NOT EXISTS watches (
+                    sub_id INTEGER NOT NULL,
+                    chain TEXT NOT NULL,
+                    address TEXT NOT NULL,
+                    start_block INTEGER NOT NULL,
+                    PRIMARY KEY (sub_id, address)
+                );
+                CREATE INDEX IF NOT EXISTS watches_by_address ON watches (chain, address);
+                CREATE TABLE IF NOT EXISTS watch_cursors (
+                    chain TEXT NOT NULL,
+                    address TEXT NOT NULL,
+                    block INTEGER NOT NULL,
+                    PRIMARY KEY (chain, address)
+                );
+                CREATE TABLE IF NOT EXISTS outbox (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    sub_id INTEGER NOT NULL,
+                    event_key TEXT NOT NULL,
+                    payload TEXT NOT NULL,
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    next_attempt REAL NOT NULL,
+                    dead INTEGER NOT NULL DEFAULT 0,
+                    last_error TEXT,
+                    UNIQUE (sub_id, event_key)
+                );
+                CREATE INDEX IF NOT EXISTS outbox_due ON outbox (dead, next_attempt);
+            """)
+            if "locked_until" not in [r[1] for r in self._db.execute("PRAGMA table_info(outbox)")]:
+                self._db.execute("ALTER TABLE outbox ADD COLUMN locked_until REAL NOT NULL DEFAULT 0")
+
+    def add_subscription(self, chain: str, url: str, secret: Optional[str], addresses: List[str], start_block: int) -> int:
+        # start_block is the last block considered already processed for newly watched addresses
+        with self._lock, self._db:
+            cur = self._db.execute(
+                "INSERT INTO subscriptions (chain, url, secret, created_at) VALUES (?, ?, ?, ?)", (chain, url, secret, utc_now())
+            )
+            sub_id = cur.lastrowid
+            for a in dict.fromkeys(x.lower() for x in addresses):
+                row = self._db.execute("SELECT block FROM watch_cursors WHERE chain = ? AND address = ?", (chain, a)).fetchone()
+                if row is None:
+                    self._db.execute("INSERT INTO watch_cursors VALUES (?, ?, ?)", (chain, a, start_block))
+                elif row[0] > start_block:
+                    self._db.execute(
+                        "UPDATE watches SET start_block = MAX(start_block, ?) WHERE chain = ? AND address = ?", (row[0], chain, a)
+                    )
+                    self._db.execute("UPDATE watch_cursors SET block = ? WHERE chain = ? AND address = ?", (start_block, chain, a))
+                self._db.execute("INSERT OR IGNORE INTO watches VALUES (?, ?, ?, ?)", (sub_id, chain, a, start_block))
+        return sub_id
+
+    def delete_subscription(self, sub_id: int) -> bool:
+        with self._lock, self._db:
+            row = self._db.execute("SELECT chain FROM subscriptions WHERE id = ?", (sub_id,)).fetchone()
+            if row is None:
+                return False
+            self._db.execute("DELETE FROM outbox WHERE sub_id = ?", (sub_id,))
+            self._db.execute("DELETE FROM watches WHERE sub_id = ?", (sub_id,))
+            self._db.execute("DELETE FROM subscriptions WHERE id = ?", (sub_id,))
+            self._db.execute(
+                "DELETE FROM watch_cursors WHERE chain = ? AND address NOT IN (SELECT address FROM watches WHERE chain = ?)",
+                (row[0], row[0]),
+            )
+        return True
+
+    def subscriptions(self) -> List[Dict[str, Any]]:
+        with self._lock:
+            subs = self._db.execute("SELECT id, chain, url, secret IS NOT NULL, created_at FROM subscriptions ORDER BY id").fetchall()
+            watched: Dict[int, List[str]] = {}
+            for sub_id, address in self._db.execute("SELECT sub_id, address FROM watches ORDER BY address"):
+                watched.setdefault(sub_id, []).append(address)
+            pending = dict(self._db.execute("SELECT sub_id, COUNT(*) FROM outbox WHERE dead = 0 GROUP BY sub_id").fetchall())
+        return [
+            {"id": i, "chain": c, "url": u, "signed": bool(signed), "addresses": watched.get(i, []), "pending": pending.get(i, 0), "created_at": t}
+            for i, c, u, signed, t in subs
+        ]
+
+    def cursors(self, chain: str) -> Dict[str, int]:
+        with self._lock:
+            return dict(self._db.execute("SELECT address, block FROM watch_cursors WHERE chain = ?", (chain,)).fetchall())
+
+    def record(self, chain: str, addresses: List[str], from_block: int, to_block: int, events: List[Tuple[str, int, str, bytes]]) -> None:
+        # events are (watched address, block, event key, payload) for (from_block, to_block]; cursors
+        # move in the same transaction, compare-and-set against from_block. An address whose cursor
+        # changed meanwhile (moved back for a backfill, or unwatched) is skipped and rescanned later.
+        now = time.time()
+        with self._lock, self._db:
+            current = dict(self._db.execute("SELECT address, block FROM watch_cursors WHERE chain = ?", (chain,)).fetchall())
+            live = {a for a in addresses if current.get(a) == from_block}
+            for address, block, key, payload in events:
+                if address not in live:
+                    continue
+                subs = self._db.execute(
+                    "SELECT sub_id FROM watches WHERE chain = ? AND address = ? AND start_block < ?", (chain, address, block)
+                ).fetchall()
+                self._db.executemany(
+                    "INSERT OR IGNORE INTO outbox (sub_id, event_key, payload, next_attempt) VALUES (?, ?, ?, ?)",
+                    [(sub_id, key, payload.decode(), now) for (sub_id,) in subs],
+                )
+            self._db.executemany(
+                "UPDATE watch_cursors SET block = ? WHERE chain = ? AND address = ? AND block = ?",
+                [(to_block, chain, a, from_block) for a in live],
+            )
+
+    def due(self, now: float, limit: int) -> List[Tuple[int, str, Optional[str], List[Tuple[int, int, str]]]]:
+        # Claims (sub_id, url, secret, [(outbox id, attempts, payload)]) for subscriptions with due
+        # events: the rows are leased for WEBHOOK_LEASE seconds in one write transaction, so
+        # concurrent delivery loops (other workers on the same file) never POST the same rows.
+        with self._lock, self._db:
+            self._db.execute("BEGIN IMMEDIATE")
+            subs = self._db.execute(
+                "SELECT DISTINCT o.sub_id, s.url, s.secret FROM outbox o JOIN subscriptions s ON s.id = o.sub_id "
+                "WHERE o.dead = 0 AND o.next_attempt <= ? AND o.locked_until <= ?",
+                (now, now),
+            ).fetchall()
+            out = [
+                (sub_id, url, secret, self._db.execute(
+                    "SELECT id, attempts, payload FROM outbox WHERE sub_id = ? AND dead = 0 AND next_attempt <= ? AND locked_until <= ? "
+                    "ORDER BY id LIMIT ?",
+                    (sub_id, now, now, limit),
+                ).fetchall())
+                for sub_id, url, secret in subs
+            ]
+            self._db.executemany(
+                "UPDATE outbox SET locked_until = ? WHERE id = ?", [(now + WEBHOOK_LEASE, r[0]) for sub in out for r in sub[3]]
+            )
+        return out
+
+    def delivered(self, ids: List[int]) -> None:
+        with self._lock, self._db:
+            self._db.executemany("DELETE FROM outbox WHERE id = ?", [(i,) for i in ids])
+
+    def failed(self, ids: List[int], attempts: int, error: str) -> None:
+        # full-jitter exponential backoff; rows past WEBHOOK_MAX_ATTEMPTS are kept but marked dead
+        delay = random.uniform(0, min(WEBHOOK_RETRY_MAX, WEBHOOK_RETRY_BASE * (2 ** attempts)))
+        dead = 1 if attempts + 1 >= WEBHOOK_MAX_ATTEMPTS else 0
+        with self._lock, self._db:
+            self._db.executemany(
+                "UPDATE outbox SET attempts = attempts + 1, next_attempt = ?, dead = ?, last_error = ?, locked_until = 0 WHERE id = ?",
+                [(time.time() + delay, dead, error[:500], i) for i in ids],
+            )
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            subs = self._db.execute("SELECT COUNT(*) FROM subscriptions").fetchone()[0]
+            watched = dict(self._db.execute("SELECT chain, COUNT(*) FROM watch_cursors GROUP BY chain").fetchall())
+            pending, dead = self._db.execute(
+                "SELECT COALESCE(SUM(dead = 0), 0), COALESCE(SUM(dead = 1), 0) FROM outbox"
+            ).fetchone()
+        return {"subscriptions": subs, "watched_addresses": watched, "outbox_pending": pending, "outbox_dead": dead}
+
+def _watch_events(url: str, chain: Literal["eth", "bsc"], addresses: List[str], from_block: int, to_block: int) -> List[Tuple[str, int, str, bytes]]:
+    # one OR-list scan covers every address in the group
+    by_addr = evm_scan_usdt_transfers_many(url, chain, addresses, from_block, to_block)
+    decimals = USDT[chain]["decimals"]
+    out = []
+    for a, logs in by_addr.items():
+        for L in logs:
+            topics = L["topics"]
+            frm, to = "0x" + topics[1][-40:].lower(), "0x" + topics[2][-40:].lower()
+            block, log_index = int(L["blockNumber"], 16), int(L["logIndex"], 16)
+            out.append((a, block, f"{chain}:{L.get('transactionHash')}:{log_index}:{a}", json_bytes({
+                "chain": chain,
+                "address": a,
+                "direction": "self" if frm == to else ("out" if frm == a else "in"),
+                "blockNumber": block,
+                "txHash": L.get("transactionHash"),
+                "logIndex": log_index,
+                "from": frm,
+                "to": to,
+                "amount": format_units(int(L.get("data") or "0x0", 16), decimals),
+                "contract": L.get("address"),
+            })))
+    return out
+
+def watch_poll(store: WatchStore, chain: Literal["eth", "bsc"]) -> int:
+    # Advances every watched address to the confirmed head. Addresses sharing a cursor are
+    # queried together; the group with the lowest cursor only runs up to the next cursor, so
+    # lagging (e.g. backfilling) addresses merge into the main group once they catch up.
+    cursors = store.cursors(chain)
+    if not cursors:
+        return 0
+    url = ETH_RPC if chain == "eth" else BSC_RPC
+    target = evm_block_number(url) - WATCH_CONFIRMATIONS[chain]
+    found = 0
+    while True:
+        behind = {a: c for a, c in cursors.items() if c < target}
+        if not behind:
+            return found
+        low = min(behind.values())
+        group = [a for a, c in behind.items() if c == low]
+        hi = min([target, low + WATCH_MAX_RANGE] + [c for c in behind.values() if c > low])
+        events = _watch_events(url, chain, group, low + 1, hi)
+        store.record(chain, group, low, hi, events)
+        found += len(events)
+        for a in group:
+            cursors[a] = hi
+
+def _webhook_send(store: WatchStore, sub: Tuple[int, str, Optional[str], List[Tuple[int, int, str]]]) -> int:
+    sub_id, url, secret, rows = sub
+    ids = [r[0] for r in rows]
+    body = json_bytes({"subscription_id": sub_id, "count": len(rows), "events": [json.loads(r[2]) for r in rows], "timestamp": utc_now()})
+    headers = {"Content-Type": "application/json"}
+    if secret:
+        headers["X-Webhook-Signature"] = "sha256=" + hmac.new(secret.encode(), body, hashlib.sha256).hexdigest()
+    try:
+        r = http_client.request("POST", url, headers, data=body, timeout=WEBHOOK_TIMEOUT)
+        error = None if 200 <= r.status_code < 300 else f"HTTP {r.status_code}"
+    except requests.RequestException as e:
+        error = error_text(e)
+    if error is None:
+        store.delivered(ids)
+        return len(ids)
+    store.failed(ids, max(r[1] for r in rows), error)
+    return 0
+
+def webhook_deliver(store: WatchStore) -> int:
+    # one batched POST per subscription with due events, subscriptions in parallel
+    due = store.due(time.time(), WEBHOOK_BATCH_MAX)
+    return sum(fan_out(due, lambda sub: _webhook_send(store, sub), "webhook", lambda sub, e: 0))
+
+class WatchService:
+    # Background threads: one poller per chain plus the outbox delivery loop
+    def __init__(self, store: WatchStore):
+        self.store = store
+        self._stop = threading.Event()
+        self._threads: List[threading.Thread] = []
+        self._last: Dict[str, Dict[str, Any]] = {}
+
+    def _loop(self, name: str, interval: float, fn: Callable[[], int]) -> None:
+        while not self._stop.is_set():
+            state = {"at": utc_now()}
+            try:
+                state["processed"] = fn()
+            except Exception as e:
+                state["error"] = error_text(e)
+            self._last[name] = state
+            if not state.get("processed"):
+                self._stop.wait(interval)
+
+    def start(self) -> None:
+        for chain, interval in WATCH_POLL_INTERVAL.items():
+            self._threads.append(threading.Thread(
+                target=self._loop, args=(f"poll_{chain}", interval, lambda c=chain: watch_poll(self.store, c)), daemon=True
+            ))
+        self._threads.append(threading.Thread(
+            target=self._loop, args=("deliver", WEBHOOK_POLL_INTERVAL, lambda: webhook_deliver(self.store)), daemon=True
+        ))
+        for t in self._threads:
+            t.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        for t in self._threads:
+            t.join(timeout=WEBHOOK_TIMEOUT)
+
+    def stats(self) -> Dict[str, Any]:
+        return {**self.store.stats(), "loops": dict(self._last)}
+
+_watch_service: Optional[WatchService] = None
+
+def watch_start() -> None:
+    global _watch_service
+    if WATCH_DB_PATH is not None:
+        _watch_service = WatchService(WatchStore(WATCH_DB_PATH))
+        _watch_service.start()
+
+def watch_stop() -> None:
+    if _watch_service is not None:
+        _watch_service.stop()
+
+def _watch_store() -> WatchStore:
+    if _watch_service is None:
+        raise HTTPException(status_code=503, detail="Watch subscriptions are disabled")
+    return _watch_service.store
+
+@app.post("/watch/subscriptions")
+def watch_subscribe(body: WatchSubscriptionBody):
+    store = _watch_store()
+    if urlsplit(body.url).scheme not in ("http", "https"):
+        raise HTTPException(status_code=400, detail="Webhook url must be http(s)")
+    invalid = [a for a in body.addresses if not is_evm_address(a)]
+    if invalid:
+        raise HTTPException(status_code=400, detail=f"Invalid {body.chain.upper()} addresses: {', '.join(invalid[:10])}")
+    if body.from_block is not None:
+        start = body.from_block - 1
+    else:
+        url = ETH_RPC if body.chain == "eth" else BSC_RPC
+        try:
+            start = evm_block_number(url) - WATCH_CONFIRMATIONS[body.chain]
         except requests.RequestException as e:
-            results.append({"status": "error", "address": addr, "error_detail": f"SOL RPC error: {e}", "timestamp": utc_now()})
+            raise HTTPException(status_code=502, detail=f"{body.chain.upper()} RPC error: {e}")
+    sub_id = store.add_subscription(body.chain, body.url, body.secret, body.addresses, start)
+    return {"status": "ok", "id": sub_id, "chain": body.chain, "addresses": len(set(a.lower() for a in body.addresses)), "start_block": start + 1, "timestamp": utc_now()}
 
-    return {"status": "ok", "count": len(results), "results": results, "timestamp": utc_now()}
+@app.get("/watch/subscriptions")
+def watch_list():
+    subs = _watch_store().subscriptions()
+    return FastJSONResponse({"status": "ok", "count": len(subs), "results": subs, "timestamp": utc_now()})
+
+@app.delete("/watch/subscriptions/{sub_id}")
+def watch_unsubscribe(sub_id: int):
+    if not _watch_store().delete_subscription(sub_id):
+        raise HTTPException(status_code=404, detail="Subscription not found")
+    return {"status": "ok", "id": sub_id, "timestamp": utc_now()}
 
 # =========================
 # HEALTH
 # =========================
+_started = time.monotonic()
+
+def _gauges(prefix: str, help: str, d: Dict[str, Any], labels: Optional[Dict[str, str]] = None) -> List[Tuple[str, str, str, List[Tuple[Dict[str, str], float]]]]:
+    # one gauge family per numeric field of a stats() dict
+    return [
+        (f"{prefix}_{k}", "gauge", f"{help}: {k}", [(labels or {}, v)])
+        for k, v in d.items()
+        if isinstance(v, (int, float)) and not isinstance(v, bool)
+    ]
+
+@metrics.collector
+def _collect_state() -> List[Tuple[str, str, str, List[Tuple[Dict[str, str], float]]]]:
+    hosts = upstream_stats()["hosts"]
+    fams = [
+        ("breaker_state", "gauge", "Circuit breaker state per upstream host (1 = current state)", [
+            ({"host": h, "state": st}, 1 if v["breaker"]["state"] == st else 0)
+            for h, v in hosts.items() for st in ("closed", "open", "half_open")
+        ]),
+        ("breaker_opens_total", "counter", "Circuit breaker openings", [({"host": h}, v["breaker"]["opens"]) for h, v in hosts.items()]),
+        ("rate_limit_throttled_total", "counter", "Calls delayed by the host token bucket", [({"host": h}, v["rate_limit"]["throttled"]) for h, v in hosts.items()]),
+        ("rate_limit_rejected_total", "counter", "Calls rejected by the host token bucket", [({"host": h}, v["rate_limit"]["rejected"]) for h, v in hosts.items()]),
+        ("hedges_total", "counter", "Hedged duplicate requests sent", [({"host": h}, v["hedges"]) for h, v in hosts.items()]),
+        ("hedge_wins_total", "counter", "Hedged requests that answered first", [({"host": h}, v["hedge_wins"]) for h, v in hosts.items()]),
+        ("executor_queue_depth", "gauge", "Tasks waiting for a worker thread", [
+            ({"pool": name}, pool._work_queue.qsize())
+            for name, pool in (("batch", _batch_pool), ("hedge", _hedge_pool), ("dispatch", _dispatch_pool))
+        ]),
+    ]
+    fams += _gauges("retry_budget", "Global retry budget", retry_budget.stats())
+    fams += _gauges("tx_cache", "Transaction cache", tx_cache.stats())
+    fams += _gauges("balance_cache", "Balance cache", balance_cache.stats())
+    if _ata_cache is not None:
+        fams += _gauges("ata_cache", "Solana token account cache", _ata_cache.stats())
+    pool = http_client.stats()
+    for h in pool.get("hosts", []):
+        fams += _gauges("http_pool", "Upstream connection pool", {k: v for k, v in h.items() if k != "host"}, {"host": h["host"]})
+    if _watch_service is not None:
+        fams += _gauges("watch", "Watch list", _watch_service.store.stats())
+    return fams
+
 @app.get("/test")
 def test():
-    return {"alive": True, "provider": "tatum+rpc", "timestamp": utc_now()}
+    open_hosts = [h for h, v in upstream_stats()["hosts"].items() if v["breaker"]["state"] != "closed"]
+    return {"alive": True, "provider": "tatum+rpc", "uptime_s": round(time.monotonic() - _started, 1), "open_circuits": open_hosts, "timestamp": utc_now()}
+
+@app.get("/metrics")
+def prometheus_metrics():
+    return Response(metrics.render(), media_type="text/plain; version=0.0.4")
+
+@app.get("/stats")
+def stats():
+    return {"tx_cache": tx_cache.stats(), "balance_cache": balance_cache.stats(), "ata_cache": _ata_cache.stats() if _ata_cache is not None else None, "http": http_client.stats(), "upstream": upstream_stats(), "watch": _watch_service.stats() if _watch_service else None, "timestamp": utc_now()}
 
 # =========================
 # RUN
@@ -0,0 +1,56 @@
+# Amount conversion cost, the former float helpers (kept here as the baseline) vs the exact
+# integer path in app:
+#   wei -> string:  fmt_decimal(from_units(x, 18))   vs  format_units(x, 18)
+#   str -> units:   to_wei(float(s), 8)              vs  parse_units(s, 8)
+#   str -> string:  fmt_decimal(float(s))            vs  format_units(parse_units(s, 8), 8)
+#
+#   python bench/amounts.py [n]
+import os
+import random
+import sys
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import app
+
+def to_wei(x: float, decimals: int = 18) -> int:
+    return int(round(x * (10 ** decimals)))
+
+def from_units(x: int, decimals: int) -> float:
+    if decimals <= 0:
+        return float(x)
+    return round(x / (10 ** decimals), 12)
+
+def fmt_decimal(value: float, max_dp: int = 18) -> str:
+    s = f"{value:.{max_dp}f}"
+    if "." in s:
+        s = s.rstrip("0").rstrip(".")
+        if "." not in s:
+            s = s + ".0"
+    return s
+
+def main() -> None:
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    rnd = random.Random(7)
+    wei = [rnd.randint(0, 10 ** 24) for _ in range(n)]
+    btc = [f"{rnd.randint(0, 2_100_000_000_000_000) / 1e8:.8f}" for _ in range(n)]
+
+    cases = [
+        ("wei -> str (float)", lambda: [fmt_decimal(from_units(x, 18)) for x in wei]),
+        ("wei -> str (exact)", lambda: [app.format_units(x, 18) for x in wei]),
+        ("btc str -> sat (float)", lambda: [to_wei(float(s), 8) for s in btc]),
+        ("btc str -> sat (exact)", lambda: [app.parse_units(s, 8) for s in btc]),
+        ("btc str -> str (float)", lambda: [fmt_decimal(float(s)) for s in btc]),
+        ("btc str -> str (exact)", lambda: [app.format_units(app.parse_units(s, 8), 8) for s in btc]),
+    ]
+    print(f"n={n}")
+    for name, fn in cases:
+        best = min(timeit.repeat(fn, number=5, repeat=5)) / 5
+        print(f"{name:>24}: {best / n * 1e9:8.1f} ns/item")
+
+    lossy = sum(1 for x in wei if fmt_decimal(from_units(x, 18)) != app.format_units(x, 18))
+    print(f"float path differs from exact result on {lossy}/{n} wei values")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,265 @@
+# Load test of every batch endpoint against the local upstream stand-in (bench/mock_upstream.py).
+# Runs the app under uvicorn in a child process, points all upstream URLs at the mock (which runs
+# here, with the load client) and reports per endpoint: p50/p99 latency, requests/s, addresses/s,
+# upstream requests per call and the app process' RSS.
+#
+#   python bench/load.py [--requests 100] [--concurrency 8] [--batch 50] [--only balance]
+#                        [--latency-ms 20] [--error-rate 0] [--rate-429 0]
+#                        [--json out.json] [--compare baseline.json] [--tolerance 0.2]
+#
+# --compare exits non-zero when an endpoint's p99 is worse than the baseline by more than --tolerance.
+import argparse
+import hashlib
+import json
+import os
+import socket
+import subprocess
+import sys
+import threading
+import time
+import warnings
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import requests
+import uvicorn
+
+import mock_upstream
+
+warnings.filterwarnings("ignore", category=DeprecationWarning)
+
+import app
+
+B58 = "123456789ABCDEFGHJKLMNPQRSTUVWXYZabcdefghijkmnopqrstuvwxyz"
+BECH32 = "qpzry9x8gf2tvdw0s3jn54khce6mua7l"
+
+def _digest(kind: str, i: int) -> bytes:
+    return hashlib.blake2b(f"{kind}:{i}".encode(), digest_size=32).digest()
+
+def evm_address(i: int) -> str:
+    return "0x" + _digest("evm", i)[:20].hex()
+
+def tron_address(i: int) -> str:
+    return "T" + "".join(B58[b % 58] for b in (_digest("tron", i) + _digest("tron2", i))[:33])
+
+def btc_address(i: int) -> str:
+    return "bc1q" + "".join(BECH32[b % 32] for b in (_digest("btc", i) + _digest("btc2", i))[:38])
+
+def sol_address(i: int) -> str:
+    return app.b58encode(_digest("sol", i))
+
+Scenario = Tuple[str, str, str, Callable[[int, int], Dict[str, Any]]]
+
+def scenarios(batch: int, tokens: bool) -> List[Scenario]:
+    # (name, group, path, body(request index, batch size)); every request uses fresh addresses
+    def addrs(fn: Callable[[int], str], i: int, n: int) -> List[str]:
+        return [fn(i * n + k) for k in range(n)]
+
+    evm_range = {"from_block": hex(mock_upstream.HEAD - 200_000), "to_block": "latest"}
+    small = max(1, min(batch, 5))
+    out: List[Scenario] = []
+    for chain, path in (("eth", "/eth/balance_batch"), ("bsc", "/bsc/balance_batch")):
+        out.append((f"{chain}_balance", "balance", path, lambda i, n: {"addresses": addrs(evm_address, i, n), "max_age": 0, "include_tokens": tokens}))
+    out += [
+        ("tron_balance", "balance", "/tron/balance_batch", lambda i, n: {"addresses": addrs(tron_address, i, n), "max_age": 0, "include_tokens": tokens}),
+        ("btc_balance", "balance", "/btc/balance_batch", lambda i, n: {"addresses": addrs(btc_address, i, n), "max_age": 0}),
+        ("solana_balance", "balance", "/solana/balance_batch", lambda i, n: {"addresses": addrs(sol_address, i, n), "max_age": 0, "include_tokens": tokens}),
+        ("portfolio", "balance", "/portfolio", lambda i, n: {
+            "addresses": [[evm_address, tron_address, btc_address, sol_address][k % 4](i * n + k) for k in range(n)],
+            "max_age": 0, "include_tokens": tokens,
+        }),
+    ]
+    for chain in ("eth", "bsc"):
+        out.append((f"{chain}_history_usdt_batch", "history", f"/{chain}/history_usdt_batch", lambda i, n: {"addresses": addrs(evm_address, i, n), **evm_range}))
+    out += [
+        ("eth_history_usdt_stream", "history", "/eth/history_usdt_batch", lambda i, n: {"addresses": addrs(evm_address, i, n), "stream": True, "output": "decoded", **evm_range}),
+        ("tron_history_batch", "history", "/tron/history_batch", lambda i, n: {"addresses": addrs(tron_address, i, n)}),
+        ("tron_history_usdt_batch", "history", "/tron/history_usdt_batch", lambda i, n: {"addresses": addrs(tron_address, i, n)}),
+        ("btc_history_batch", "history", "/btc/history_batch", lambda i, n: {"addresses": addrs(btc_address, i, n)}),
+        ("solana_history_batch", "history", "/solana/history_batch", lambda i, n: {"addresses": addrs(sol_address, i, min(n, 20)), "limit": 20}),
+        ("tron_history_export", "export", "/tron/history_export", lambda i, n: {"addresses": addrs(tron_address, i, small), "page_size": 100}),
+        ("btc_history_export", "export", "/btc/history_export", lambda i, n: {"addresses": addrs(btc_address, i, small), "page_size": 100}),
+        ("solana_history_export", "export", "/solana/history_export", lambda i, n: {"addresses": addrs(sol_address, i, small), "page_size": 100, "max_items": 200}),
+    ]
+    return out
+
+def rss_mb(pid: int) -> float:
+    # current RSS of the app process
+    try:
+        with open(f"/proc/{pid}/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2 ** 20
+    except OSError:
+        out = subprocess.run(["ps", "-o", "rss=", "-p", str(pid)], capture_output=True, text=True).stdout.strip()
+        return int(out) / 1024 if out else 0.0
+
+def peak_rss_mb(pid: int) -> Optional[float]:
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return None
+
+def percentile(sorted_vals: List[float], q: float) -> float:
+    if not sorted_vals:
+        return 0.0
+    return sorted_vals[min(len(sorted_vals) - 1, int(q * len(sorted_vals)))]
+
+def item_errors(resp: requests.Response) -> int:
+    # per-address failures inside a 200 response (JSON results or NDJSON lines)
+    if "ndjson" in resp.headers.get("content-type", ""):
+        return sum(1 for line in resp.text.splitlines() if '"status":"error"' in line.replace(" ", ""))
+    try:
+        body = resp.json()
+    except ValueError:
+        return 0
+    return sum(1 for r in body.get("results") or [] if isinstance(r, dict) and r.get("status") == "error")
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+def serve_app(port: int, upstream_url: str, log_index: Optional[str], rate_limit: float) -> None:
+    # child process: the app alone, so its RSS is not mixed with the mock's and the client's
+    app.ETH_RPC = app.BSC_RPC = app.SOL_RPC = upstream_url
+    app.TATUM_API = upstream_url
+    app.LOG_INDEX_PATH = log_index
+    app.WATCH_DB_PATH = None
+    app.SOL_ATA_CACHE_PATH = None
+    host = upstream_url.split("//", 1)[1]
+    app.RATE_LIMITS[host] = (rate_limit, max(1, int(rate_limit))) if rate_limit else (1e9, 10 ** 9)
+    uvicorn.run(app.app, host="127.0.0.1", port=port, log_level="warning", access_log=False)
+
+def start_app(port: int, upstream_url: str, log_index: Optional[str], rate_limit: float) -> subprocess.Popen:
+    cmd = [sys.executable, os.path.abspath(__file__), "--serve-app", str(port), "--upstream", upstream_url, "--rate-limit", str(rate_limit)]
+    if log_index:
+        cmd += ["--log-index", log_index]
+    proc = subprocess.Popen(cmd)
+    deadline = time.monotonic() + 20
+    while True:
+        try:
+            requests.get(f"http://127.0.0.1:{port}/test", timeout=1)
+            return proc
+        except requests.RequestException:
+            pass
+        if proc.poll() is not None or time.monotonic() > deadline:
+            proc.kill()
+            raise RuntimeError("app did not start")
+        time.sleep(0.1)
+
+def run_scenario(base: str, sc: Scenario, n_requests: int, concurrency: int, batch: int, upstream_url: str, app_pid: int) -> Dict[str, Any]:
+    name, group, path, body = sc
+    local = threading.local()
+
+    def call(i: int) -> Tuple[float, int, int, int]:
+        s = getattr(local, "s", None)
+        if s is None:
+            s = local.s = requests.Session()
+        payload = body(i, batch)
+        t0 = time.perf_counter()
+        r = s.post(base + path, json=payload, timeout=300)
+        dt = time.perf_counter() - t0
+        return dt, r.status_code, item_errors(r) if r.status_code == 200 else 0, len(payload["addresses"])
+
+    offset = int.from_bytes(_digest(name, 0)[:2], "big") * 100_000   # distinct addresses per scenario
+    for i in range(min(concurrency, n_requests)):
+        call(offset + n_requests + i)  # warm-up: connections, code paths
+    before = requests.get(upstream_url + "/_stats").json()["requests"]
+    t0 = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        res = list(pool.map(call, range(offset, offset + n_requests)))
+    wall = time.perf_counter() - t0
+    upstream = requests.get(upstream_url + "/_stats").json()["requests"] - before
+    lat = sorted(r[0] for r in res)
+    return {
+        "name": name,
+        "group": group,
+        "requests": n_requests,
+        "http_errors": sum(1 for r in res if r[1] != 200),
+        "item_errors": sum(r[2] for r in res),
+        "p50_ms": round(percentile(lat, 0.50) * 1000, 1),
+        "p99_ms": round(percentile(lat, 0.99) * 1000, 1),
+        "req_s": round(n_requests / wall, 1),
+        "addr_s": round(sum(r[3] for r in res) / wall, 1),
+        "upstream_per_req": round(upstream / n_requests, 1),
+        "rss_mb": round(rss_mb(app_pid), 1),
+    }
+
+def compare(rows: List[Dict[str, Any]], baseline_path: str, tolerance: float) -> bool:
+    with open(baseline_path) as f:
+        base = {r["name"]: r for r in json.load(f)["results"]}
+    ok = True
+    print(f"\nvs {baseline_path} (p99 tolerance {tolerance:.0%})")
+    for r in rows:
+        b = base.get(r["name"])
+        if b is None or not b["p99_ms"]:
+            continue
+        delta = r["p99_ms"] / b["p99_ms"] - 1
+        flag = "REGRESSION" if delta > tolerance else ""
+        ok = ok and not flag
+        print(f"  {r['name']:<26} p99 {b['p99_ms']:>8.1f} -> {r['p99_ms']:>8.1f} ms ({delta:+.0%}) {flag}")
+    return ok
+
+def main() -> None:
+    p = argparse.ArgumentParser(description="Offline load test of the batch endpoints")
+    p.add_argument("--requests", type=int, default=100, help="requests per endpoint")
+    p.add_argument("--concurrency", type=int, default=8, help="concurrent client requests")
+    p.add_argument("--batch", type=int, default=50, help="addresses per request (exports use at most 5)")
+    p.add_argument("--only", default="", help="comma-separated endpoint names or groups (balance, history, export)")
+    p.add_argument("--tokens", action="store_true", help="include_tokens on balance endpoints")
+    p.add_argument("--latency-ms", type=float, default=20.0)
+    p.add_argument("--jitter-ms", type=float, default=5.0)
+    p.add_argument("--error-rate", type=float, default=0.0)
+    p.add_argument("--rate-429", type=float, default=0.0)
+    p.add_argument("--rate-limit", type=float, default=0.0, help="app-side requests/s towards the mock (0 = unlimited)")
+    p.add_argument("--json", help="write results to this file")
+    p.add_argument("--compare", help="baseline file written by --json")
+    p.add_argument("--tolerance", type=float, default=0.2)
+    p.add_argument("--log-index", help="USDT log index file for ETH/BSC history, as in the default config (default: index disabled)")
+    p.add_argument("--serve-app", type=int, help=argparse.SUPPRESS)
+    p.add_argument("--upstream", help=argparse.SUPPRESS)
+    a = p.parse_args()
+    if a.serve_app:
+        serve_app(a.serve_app, a.upstream, a.log_index, a.rate_limit)
+        return
+
+    mock, _, upstream_url = mock_upstream.start(knobs=mock_upstream.Knobs(a.latency_ms, a.jitter_ms, a.error_rate, a.rate_429))
+    port = free_port()
+    proc = start_app(port, upstream_url, a.log_index, a.rate_limit)
+    base = f"http://127.0.0.1:{port}"
+
+    wanted = {w for w in a.only.split(",") if w}
+    selected = [sc for sc in scenarios(a.batch, a.tokens) if not wanted or sc[0] in wanted or sc[1] in wanted]
+    print(f"{len(selected)} endpoints, {a.requests} requests each, concurrency {a.concurrency}, batch {a.batch}, "
+          f"upstream latency {a.latency_ms:.0f}±{a.jitter_ms:.0f} ms, errors {a.error_rate:.1%}, 429s {a.rate_429:.1%}")
+    header = f"{'endpoint':<26} {'p50 ms':>8} {'p99 ms':>8} {'req/s':>8} {'addr/s':>9} {'up/req':>7} {'errors':>7} {'rss MB':>7}"
+    print(header)
+    print("-" * len(header))
+    rows = []
+    try:
+        for sc in selected:
+            r = run_scenario(base, sc, a.requests, a.concurrency, a.batch, upstream_url, proc.pid)
+            rows.append(r)
+            print(f"{r['name']:<26} {r['p50_ms']:>8.1f} {r['p99_ms']:>8.1f} {r['req_s']:>8.1f} {r['addr_s']:>9.1f} "
+                  f"{r['upstream_per_req']:>7.1f} {r['http_errors'] + r['item_errors']:>7} {r['rss_mb']:>7.1f}")
+        peak = peak_rss_mb(proc.pid)
+        if peak is not None:
+            print(f"app peak RSS {peak:.1f} MB")
+    finally:
+        proc.terminate()
+        proc.wait(timeout=10)
+        mock.shutdown()
+    if a.json:
+        with open(a.json, "w") as f:
+            json.dump({"args": vars(a), "results": rows}, f, indent=2)
+    if a.compare and not compare(rows, a.compare, a.tolerance):
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,299 @@
+# Local stand-in for the Tatum JSON-RPC gateways and v3 REST routes used by app.py.
+# Every address gets a deterministic synthetic history, so repeated runs are comparable.
+#
+#   python bench/mock_upstream.py [--port 8545] [--latency-ms 20] [--jitter-ms 10]
+#                                 [--error-rate 0.01] [--rate-429 0.01]
+#
+# Point the app at it by setting ETH_RPC / BSC_RPC / SOL_RPC / TATUM_API to the printed URL
+# (bench/load.py does this itself).
+import argparse
+import bisect
+import hashlib
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import parse_qs, urlsplit
+
+HEAD = 20_000_000
+HISTORY_BLOCKS = 1_000_000     # synthetic transfers are spread over the last HISTORY_BLOCKS blocks
+LOGS_PER_ADDRESS = 200
+SOL_SIGS_PER_ADDRESS = 500
+TRON_TXS_PER_ADDRESS = 300
+BTC_TXS_PER_ADDRESS = 300
+MAX_LOGS = 10000               # eth_getLogs answers "more than 10000 results" above this
+TOPIC_TRANSFER = "0xddf252ad1be2c89b69c2b068fc378daa952ba7f163c4a11628f55a4df523b3ef"
+SPL_TOKEN_PROGRAM = "TokenkegQfeZyiNwAJbNbGKPFXCWuBvf9Ss623VQ5DA"
+
+class Knobs:
+    def __init__(self, latency_ms: float = 20.0, jitter_ms: float = 10.0, error_rate: float = 0.0, rate_429: float = 0.0, retry_after: float = 0.2):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self.rate_429 = rate_429
+        self.retry_after = retry_after
+
+class Counters:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.rpc_calls: Dict[str, int] = {}
+        self.rest_calls: Dict[str, int] = {}
+        self.errors = 0
+        self.throttled = 0
+
+    def add(self, table: Dict[str, int], key: str, n: int = 1) -> None:
+        with self._lock:
+            table[key] = table.get(key, 0) + n
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            return {"requests": self.requests, "rpc_calls": dict(self.rpc_calls), "rest_calls": dict(self.rest_calls), "errors": self.errors, "throttled": self.throttled}
+
+def _seed(*parts: Any) -> int:
+    return int.from_bytes(hashlib.blake2b("|".join(map(str, parts)).encode(), digest_size=8).digest(), "big")
+
+def _counterparty(rng: random.Random) -> str:
+    return "0x" + "%040x" % rng.getrandbits(160)
+
+_log_cache: Dict[str, Tuple[List[int], List[Dict[str, Any]]]] = {}
+_log_lock = threading.Lock()
+
+def address_logs(contract: str, address: str) -> Tuple[List[int], List[Dict[str, Any]]]:
+    # (sorted block numbers, logs) of one address' USDT transfers; even entries are outgoing
+    key = contract.lower() + address.lower()
+    with _log_lock:
+        hit = _log_cache.get(key)
+    if hit is not None:
+        return hit
+    rng = random.Random(_seed("logs", key))
+    blocks = sorted(rng.randrange(HEAD - HISTORY_BLOCKS, HEAD) for _ in range(LOGS_PER_ADDRESS))
+    me = "0x" + "0" * 24 + address[-40:].lower()
+    logs = []
+    for i, b in enumerate(blocks):
+        other = "0x" + "0" * 24 + _counterparty(rng)[2:]
+        frm, to = (me, other) if i % 2 == 0 else (other, me)
+        tx = "0x%064x" % _seed("tx", key, i)
+        logs.append({
+            "address": contract,
+            "blockNumber": hex(b),
+            "transactionHash": tx,
+            "logIndex": hex(i % 16),
+            "data": hex(rng.randrange(1, 10 ** 11)),
+            "topics": [TOPIC_TRANSFER, frm, to],
+        })
+    with _log_lock:
+        _log_cache[key] = (blocks, logs)
+    return blocks, logs
+
+def _as_list(t: Any) -> List[str]:
+    if t is None:
+        return []
+    return t if isinstance(t, list) else [t]
+
+def eth_get_logs(flt: Dict[str, Any]) -> Any:
+    lo, hi = int(flt["fromBlock"], 16), int(flt["toBlock"], 16)
+    topics = flt.get("topics") or []
+    t1 = _as_list(topics[1]) if len(topics) > 1 else []
+    t2 = _as_list(topics[2]) if len(topics) > 2 else []
+    if not t1 and not t2:
+        raise RpcFailure(-32005, "query returned more than 10000 results")
+    want1, want2 = {t.lower() for t in t1}, {t.lower() for t in t2}
+    out: Dict[Tuple[str, str], Dict[str, Any]] = {}
+    for topic in want1 | want2:
+        blocks, logs = address_logs(flt.get("address") or "", "0x" + topic[-40:])
+        for L in logs[bisect.bisect_left(blocks, lo):bisect.bisect_right(blocks, hi)]:
+            if (not want1 or L["topics"][1] in want1) and (not want2 or L["topics"][2] in want2):
+                out[(L["transactionHash"], L["logIndex"])] = L
+    if len(out) > MAX_LOGS:
+        raise RpcFailure(-32005, f"query returned more than {MAX_LOGS} results")
+    return sorted(out.values(), key=lambda L: (int(L["blockNumber"], 16), int(L["logIndex"], 16)))
+
+def sol_signatures(address: str, limit: int, before: Optional[str]) -> List[Dict[str, Any]]:
+    start = 0
+    if before and before.startswith(address[:12]):
+        start = int(before.rsplit("x", 1)[1]) + 1
+    out = []
+    for i in range(start, min(SOL_SIGS_PER_ADDRESS, start + limit)):
+        out.append({"signature": f"{address[:12]}x{i}", "slot": 250_000_000 - i * 10, "blockTime": 1_700_000_000 - i * 4, "err": None})
+    return out
+
+def sol_transaction(sig: str) -> Dict[str, Any]:
+    i = int(sig.rsplit("x", 1)[1])
+    ix = {"program": "spl-token", "programId": SPL_TOKEN_PROGRAM} if i % 2 else {"program": "system", "programId": "11111111111111111111111111111111"}
+    return {
+        "slot": 250_000_000 - i * 10,
+        "blockTime": 1_700_000_000 - i * 4,
+        "meta": {"err": None, "fee": 5000},
+        "transaction": {"signatures": [sig], "message": {"instructions": [ix]}},
+    }
+
+class RpcFailure(Exception):
+    def __init__(self, code: int, message: str):
+        super().__init__(message)
+        self.code = code
+        self.message = message
+
+def rpc_result(method: str, params: List[Any]) -> Any:
+    if method == "eth_blockNumber":
+        return hex(HEAD)
+    if method == "eth_getBalance":
+        return hex(_seed("bal", params[0].lower()) % 10 ** 20)
+    if method == "eth_call":
+        call = params[0]
+        return "0x%064x" % (_seed("erc20", call.get("to", "").lower(), call.get("data", "")[-40:]) % 10 ** 12)
+    if method == "eth_getLogs":
+        return eth_get_logs(params[0])
+    if method == "getSignaturesForAddress":
+        opts = params[1] if len(params) > 1 else {}
+        return sol_signatures(params[0], int(opts.get("limit", 1000)), opts.get("before"))
+    if method == "getTransaction":
+        return sol_transaction(params[0])
+    if method == "getBalance":
+        return {"context": {"slot": 250_000_000}, "value": _seed("lamports", params[0]) % 10 ** 12}
+    if method == "getTokenAccountsByOwner":
+        owner = params[0]
+        return {"context": {"slot": 250_000_000}, "value": [{
+            "pubkey": "ATA" + owner[3:],
+            "account": {"data": {"parsed": {"info": {"owner": owner, "tokenAmount": {"amount": str(_seed("spl", owner) % 10 ** 10), "decimals": 6}}}}},
+        }]}
+    if method == "getMultipleAccounts":
+        return {"context": {"slot": 250_000_000}, "value": [
+            {"lamports": _seed("lamports", k) % 10 ** 12, "owner": "11111111111111111111111111111111", "data": ["", "base64"], "executable": False}
+            for k in params[0]
+        ]}
+    raise RpcFailure(-32601, f"method not found: {method}")
+
+def rest_result(path: str, query: Dict[str, List[str]]) -> Tuple[str, Any]:
+    # (route name, payload) for the Tatum v3 routes used by app.py; KeyError -> 404
+    parts = path.strip("/").split("/")
+    page_size = int((query.get("pageSize") or ["50"])[0])
+    if parts[:3] == ["v3", "tron", "account"]:
+        a = parts[3]
+        return "tron_account", {"address": a, "balance": _seed("trx", a) % 10 ** 12, "trc20": [{"TR7NHqjeKQxGTCi8q8ZY4pL8otSzgjLj6t": str(_seed("trc20", a) % 10 ** 11)}]}
+    if parts[:4] == ["v3", "tron", "transaction", "account"]:
+        a, usdt = parts[4], len(parts) > 5
+        start = int((query.get("next") or ["0"])[0])
+        end = min(TRON_TXS_PER_ADDRESS, start + page_size)
+        if usdt:
+            data = [{"txID": "%064x" % _seed("trc20tx", a, i), "token": "TR7NHqjeKQxGTCi8q8ZY4pL8otSzgjLj6t", "blockNumber": 60_000_000 - i * 20,
+                     "timestamp": (1_700_000_000 - i * 60) * 1000, "value": str(_seed("v", a, i) % 10 ** 9)} for i in range(start, end)]
+        else:
+            data = [{"txID": "%064x" % _seed("trxtx", a, i), "blockNumber": 60_000_000 - i * 20,
+                     "rawData": {"timestamp": (1_700_000_000 - i * 60) * 1000}} for i in range(start, end)]
+        return "tron_history_usdt" if usdt else "tron_history", {"data": data, "next": str(end) if end < TRON_TXS_PER_ADDRESS else None}
+    if parts[:4] == ["v3", "bitcoin", "address", "balance"]:
+        a = parts[4]
+        sats = _seed("btc", a) % 10 ** 10
+        return "btc_balance", {"incoming": f"{sats * 3 / 1e8:.8f}", "outgoing": f"{sats * 2 / 1e8:.8f}", "incomingPending": "0", "outgoingPending": "0"}
+    if parts[:4] == ["v3", "bitcoin", "transaction", "address"]:
+        a = parts[4]
+        off = int((query.get("offset") or ["0"])[0])
+        return "btc_history", [{"hash": "%064x" % _seed("btctx", a, i), "blockNumber": 820_000 - i, "time": 1_700_000_000 - i * 600, "fee": 1000}
+                               for i in range(off, min(BTC_TXS_PER_ADDRESS, off + page_size))]
+    if parts[:4] == ["v3", "solana", "account", "balance"]:
+        a = parts[4]
+        return "sol_balance", {"balance": f"{_seed('lamports', a) % 10 ** 12 / 1e9:.9f}"}
+    raise KeyError(path)
+
+def make_handler(knobs: Knobs, counters: Counters):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, *args: Any) -> None:
+            pass
+
+        def _send(self, status: int, payload: Any, headers: Optional[Dict[str, str]] = None) -> None:
+            body = json.dumps(payload, separators=(",", ":")).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            for k, v in (headers or {}).items():
+                self.send_header(k, v)
+            self.end_headers()
+            self.wfile.write(body)
+
+        def _faults(self) -> bool:
+            # latency first, then the injected 429 / 500 (True = response already sent)
+            with counters._lock:
+                counters.requests += 1
+            delay = max(0.0, random.gauss(knobs.latency_ms, knobs.jitter_ms)) / 1000
+            if delay:
+                time.sleep(delay)
+            r = random.random()
+            if r < knobs.rate_429:
+                with counters._lock:
+                    counters.throttled += 1
+                self._send(429, {"error": "Too Many Requests"}, {"Retry-After": str(knobs.retry_after)})
+                return True
+            if r < knobs.rate_429 + knobs.error_rate:
+                with counters._lock:
+                    counters.errors += 1
+                self._send(500, {"error": "Internal Server Error"})
+                return True
+            return False
+
+        def do_POST(self) -> None:
+            body = json.loads(self.rfile.read(int(self.headers.get("Content-Length") or 0)) or b"null")
+            if self._faults():
+                return
+            calls = body if isinstance(body, list) else [body]
+            out = []
+            for c in calls:
+                counters.add(counters.rpc_calls, c.get("method", "?"))
+                try:
+                    out.append({"jsonrpc": "2.0", "id": c.get("id"), "result": rpc_result(c.get("method"), c.get("params") or [])})
+                except RpcFailure as e:
+                    out.append({"jsonrpc": "2.0", "id": c.get("id"), "error": {"code": e.code, "message": e.message}})
+            self._send(200, out if isinstance(body, list) else out[0])
+
+        def do_GET(self) -> None:
+            u = urlsplit(self.path)
+            if u.path == "/_stats":
+                self._send(200, counters.snapshot())
+                return
+            if self._faults():
+                return
+            try:
+                route, payload = rest_result(u.path, parse_qs(u.query))
+            except (KeyError, IndexError, ValueError):
+                self._send(404, {"error": "Not Found", "path": u.path})
+                return
+            counters.add(counters.rest_calls, route)
+            self._send(200, payload)
+
+    return Handler
+
+class MockServer(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 1024
+
+def start(host: str = "127.0.0.1", port: int = 0, knobs: Optional[Knobs] = None) -> Tuple[MockServer, Counters, str]:
+    # serves in a background thread; returns (server, counters, base url)
+    counters = Counters()
+    server = MockServer((host, port), make_handler(knobs or Knobs(), counters))
+    threading.Thread(target=server.serve_forever, daemon=True, name="mock-upstream").start()
+    return server, counters, f"http://{host}:{server.server_address[1]}"
+
+def main() -> None:
+    p = argparse.ArgumentParser(description="Local Tatum JSON-RPC + v3 REST stand-in")
+    p.add_argument("--host", default="127.0.0.1")
+    p.add_argument("--port", type=int, default=8545)
+    p.add_argument("--latency-ms", type=float, default=20.0)
+    p.add_argument("--jitter-ms", type=float, default=10.0)
+    p.add_argument("--error-rate", type=float, default=0.0, help="fraction of requests answered with HTTP 500")
+    p.add_argument("--rate-429", type=float, default=0.0, help="fraction of requests answered with HTTP 429")
+    p.add_argument("--retry-after", type=float, default=0.2, help="Retry-After seconds sent with 429s")
+    a = p.parse_args()
+    server, _, url = start(a.host, a.port, Knobs(a.latency_ms, a.jitter_ms, a.error_rate, a.rate_429, a.retry_after))
+    print(f"mock upstream on {url} (JSON-RPC: POST /, REST: GET /v3/..., counters: GET /_stats)")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
+
+if __name__ == "__main__":
+    main()
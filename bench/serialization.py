@@ -0,0 +1,59 @@
+# Per-item cost of building and serializing a balance batch response:
+#   before: BalanceResponse models -> .dict() -> FastAPI jsonable_encoder -> json.dumps
+#   after:  BalanceResult records -> to_dict() -> FastJSONResponse (orjson when installed)
+#
+#   python bench/serialization.py [items] [rounds]
+import os
+import sys
+import timeit
+import warnings
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+
+import app
+
+warnings.filterwarnings("ignore", category=DeprecationWarning)
+
+BTC_RAW = {"incoming": "1.23456789", "outgoing": "0.5", "incomingPending": "0", "outgoingPending": "0"}
+
+def before(n: int) -> bytes:
+    results = [
+        app.BalanceResponse(
+            status="ok",
+            address=f"bc1q{i:038d}",
+            native=app.NativeBalance(chain="btc", value="0.73456789", raw=BTC_RAW),
+            timestamp=app.utc_now(),
+        )
+        for i in range(n)
+    ]
+    payload = {"status": "ok", "count": n, "results": [r.dict() for r in results], "timestamp": app.utc_now()}
+    return JSONResponse(jsonable_encoder(payload)).body
+
+def after(n: int) -> bytes:
+    results = [
+        app.BalanceResult(
+            status="ok",
+            address=f"bc1q{i:038d}",
+            native=app.native_balance("btc", "0.73456789", BTC_RAW),
+            timestamp=app.utc_now(),
+        )
+        for i in range(n)
+    ]
+    return app._batch_response(results).body
+
+def main() -> None:
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 100
+    rounds = int(sys.argv[2]) if len(sys.argv) > 2 else 200
+    print(f"items={n} rounds={rounds} orjson={'yes' if app.orjson is not None else 'no'}")
+    costs = {}
+    for name, fn in (("before", before), ("after", after)):
+        best = min(timeit.repeat(lambda: fn(n), number=rounds, repeat=5))
+        costs[name] = best / rounds / n * 1e6
+        print(f"{name:>7}: {costs[name]:8.2f} us/item")
+    print(f"speedup: {costs['before'] / costs['after']:.1f}x")
+
+if __name__ == "__main__":
+    main()